@@ -1,23 +1,372 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+import time as time_module
+IMPORT_STARTED = time_module.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, monitoring
+from pymongo.errors import OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, NamedTuple
 import uuid
-from datetime import datetime, timezone, date, time
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import json
+import base64
+import re
+import io
+import asyncio
+import hashlib
+import functools
+import csv
+import zlib
+import gzip
+import bisect
+import heapq
+import sys
+import threading
+import contextvars
+import contextlib
+from collections import Counter, OrderedDict, defaultdict, deque
+from itertools import chain
+from datetime import datetime, timezone, date, time, timedelta
+import numpy as np
+from storage import MEAL_SLOTS, create_storage
+IMPORTS_FINISHED = time_module.perf_counter()
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Shared recipe cache backend is optional
+    redis_asyncio = None
+
+try:
+    import orjson
+except ImportError:  # Fast list responses fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Responses are only gzip-compressed without it
+    brotli = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics configuration
+METRICS_SLOW_REQUEST_MS = float(os.environ.get('METRICS_SLOW_REQUEST_MS', '0'))  # 0 disables the slow-request log
+
+# Metrics
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+class MetricCounter:
+    """Monotonic counter per label set, rendered in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = defaultdict(float)
+        self._lock = threading.Lock()  # Command events arrive on Motor's executor threads
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self.values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set, rendered in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names + ('le',), labels + (bound,))} {cumulative}")
+            label_text = format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to complete HTTP requests, by route template", ("method", "route", "status"),
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Time MongoDB took to answer each command", ("collection", "command"),
+)
+mongo_command_failures = MetricCounter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ("collection", "command"),
+)
+llm_call_duration = Histogram(
+    "llm_call_duration_seconds", "Time spent in LlmChat calls", ("purpose", "outcome"),
+)
+llm_tokens = MetricCounter(
+    "llm_tokens_total", "Estimated tokens (~4 characters each) sent to and received from the LLM", ("purpose", "direction"),
+)
+METRICS = (http_request_duration, mongo_command_duration, mongo_command_failures, llm_call_duration, llm_tokens)
+
+# Time spent per dependency by the current request, for the slow-request log
+request_breakdown = contextvars.ContextVar("request_breakdown", default=None)
+
+def record_breakdown(part, seconds):
+    breakdown = request_breakdown.get()
+    if breakdown is not None:
+        breakdown[part] = breakdown.get(part, 0.0) + seconds
+        breakdown[f"{part}_calls"] = breakdown.get(f"{part}_calls", 0) + 1
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Time every command by collection and operation.
+
+    Motor runs pymongo on executor threads with a copy of the caller's context,
+    so the request's breakdown dict is reachable from these callbacks.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        self._collections[event.request_id] = collection if isinstance(collection, str) else "-"
+
+    def _finish(self, event):
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe((self._collections.pop(event.request_id, "-"), event.command_name), seconds)
+        record_breakdown("mongo", seconds)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        mongo_command_failures.inc((self._collections.get(event.request_id, "-"), event.command_name))
+        self._finish(event)
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request through the last body chunk, labelled by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time_module.perf_counter()
+        status = 500
+        breakdown = {}
+        token = request_breakdown.set(breakdown)
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_breakdown.reset(token)
+            elapsed = time_module.perf_counter() - started
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe((scope["method"], route, str(status)), elapsed)
+            startup_profile.request_served()
+            if METRICS_SLOW_REQUEST_MS and elapsed * 1000 >= METRICS_SLOW_REQUEST_MS:
+                log_slow_request(scope["method"], route, status, elapsed, breakdown)
+
+def log_slow_request(method, route, status, elapsed, breakdown):
+    mongo = breakdown.get("mongo", 0.0)
+    llm = breakdown.get("llm", 0.0)
+    logging.warning(
+        f"Slow request {method} {route} {status} took {elapsed * 1000:.0f}ms: "
+        f"mongo {mongo * 1000:.0f}ms in {breakdown.get('mongo_calls', 0)} commands, "
+        f"llm {llm * 1000:.0f}ms in {breakdown.get('llm_calls', 0)} calls, "
+        f"app {max(0.0, elapsed - mongo - llm) * 1000:.0f}ms"
+    )
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Compression configuration
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))  # bytes; smaller bodies are sent as is
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Compression
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain"}
+COMPRESSION_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding):
+    """The supported encoding the client weights highest (br on ties), or None for identity"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in COMPRESSION_ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """Compress /api responses of at least minimum_size bytes with the encoding the client prefers.
+
+    Only responses sent as a single body are compressed; streamed ones (SSE,
+    exports) pass through so their chunks are not held back. A compressed
+    response's ETag gets the encoding appended, as it is a different representation.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api"):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            if (
+                message["type"] == "http.response.body"
+                and not message.get("more_body", False)
+                and "content-encoding" not in headers
+                and content_type in COMPRESSIBLE_TYPES
+            ):
+                headers.add_vary_header("Accept-Encoding")
+                if len(body) >= self.minimum_size:
+                    body = compress_body(body, encoding)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    etag = headers.get("etag")
+                    if etag and etag.endswith('"'):
+                        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                    message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+# Startup profile
+class StartupProfile:
+    """Seconds spent in each phase from the start of the server.py import to the first served request"""
+
+    def __init__(self, started):
+        self.started = started
+        self.phases = {}
+        self.ready_at = None
+        self.first_request_at = None
+
+    def record(self, name, seconds):
+        self.phases[name] = round(seconds, 4)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time_module.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time_module.perf_counter() - started)
+
+    def mark_ready(self):
+        self.ready_at = time_module.perf_counter()
+
+    def request_served(self):
+        if self.first_request_at is None:
+            self.first_request_at = time_module.perf_counter()
+
+    def report(self):
+        def since_import(moment):
+            return round(moment - self.started, 4) if moment is not None else None
+        return {
+            "phases": dict(self.phases),
+            "ready_seconds": since_import(self.ready_at),
+            "first_request_seconds": since_import(self.first_request_at),
+        }
+
+startup_profile = StartupProfile(IMPORT_STARTED)
+startup_profile.record("dependency_imports", IMPORTS_FINISHED - IMPORT_STARTED)
+
+# Storage configuration
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')  # 'mongo' or 'memory' (embedded, no MongoDB needed)
+
+# MongoDB connection, only when the Mongo backend is selected
+if STORAGE_BACKEND == 'mongo':
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
+    db = client[os.environ['DB_NAME']]
+else:
+    client = None
+    db = None
+
+storage = create_storage(STORAGE_BACKEND, db)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -25,8 +374,85 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Recipe cache configuration
+RECIPE_CACHE_SIZE = int(os.environ.get('RECIPE_CACHE_SIZE', '10000'))
+RECIPE_CACHE_TTL = float(os.environ.get('RECIPE_CACHE_TTL', '300'))
+RECIPE_CACHE_REDIS_URL = os.environ.get('RECIPE_CACHE_REDIS_URL', '')
+
+# Cross-worker recipe index sync configuration
+RECIPE_INDEX_SYNC_INTERVAL = float(os.environ.get('RECIPE_INDEX_SYNC_INTERVAL', '5'))  # seconds; 0 disables polling
+RECIPE_INDEX_SYNC_GAP_TIMEOUT = float(os.environ.get('RECIPE_INDEX_SYNC_GAP_TIMEOUT', '60'))  # seconds before a write missing from the change log forces a full rescan
+RECIPE_CHANGE_LOG_TTL = float(os.environ.get('RECIPE_CHANGE_LOG_TTL', '86400'))
+
+# AI nutrition analysis cache configuration
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', '1000'))
+ANALYSIS_CACHE_TTL = float(os.environ.get('ANALYSIS_CACHE_TTL', '86400'))
+
+# AI chat session configuration
+CHAT_SESSION_CACHE_SIZE = int(os.environ.get('CHAT_SESSION_CACHE_SIZE', '1000'))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', '3000'))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.environ.get('CHAT_SUMMARY_TOKEN_BUDGET', '500'))
+
+# Chat history write-behind configuration
+CHAT_WRITER_QUEUE_SIZE = int(os.environ.get('CHAT_WRITER_QUEUE_SIZE', '10000'))
+CHAT_WRITER_BATCH_SIZE = int(os.environ.get('CHAT_WRITER_BATCH_SIZE', '100'))
+CHAT_WRITER_FLUSH_INTERVAL = float(os.environ.get('CHAT_WRITER_FLUSH_INTERVAL', '0.5'))
+CHAT_WRITER_PUT_TIMEOUT = float(os.environ.get('CHAT_WRITER_PUT_TIMEOUT', '1.0'))
+
+# AI job queue configuration
+AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', '4'))
+AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', '3'))
+AI_JOB_RETRY_BACKOFF = float(os.environ.get('AI_JOB_RETRY_BACKOFF', '2.0'))
+AI_JOB_LEASE_SECONDS = float(os.environ.get('AI_JOB_LEASE_SECONDS', '300'))
+AI_JOB_POLL_INTERVAL = float(os.environ.get('AI_JOB_POLL_INTERVAL', '1.0'))
+AI_JOB_RESULT_TTL = float(os.environ.get('AI_JOB_RESULT_TTL', '86400'))
+
 # LLM Configuration
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '8'))
+LLM_WARMUP = os.environ.get('LLM_WARMUP', 'false').lower() == 'true'  # Import the LLM stack at startup, not on first use
+CHAT_MODEL = "gpt-4o-mini"
+# LlmChat has no streaming call, so /ai-chat/stream talks to the OpenAI-compatible API directly
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None  # None: the SDK's default endpoint
+
+# The LLM integration pulls in a large dependency tree, so it is only
+# imported by the first AI request (or at startup with LLM_WARMUP=true)
+_llm = None
+_llm_lock = threading.Lock()
+
+def _load_llm():
+    """Import the LLM integration once; returns (LlmChat, UserMessage)"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            with startup_profile.phase("llm_import"):
+                from emergentintegrations.llm.chat import LlmChat, UserMessage
+            _llm = (LlmChat, UserMessage)
+    return _llm
+
+async def llm_ready():
+    """Load the LLM integration off the event loop before an AI route first needs it"""
+    if _llm is None:
+        await asyncio.to_thread(_load_llm)
+    return _llm
+
+_streaming_llm = None
+
+def _load_streaming_llm():
+    """Import the OpenAI SDK once; returns the AsyncOpenAI client used for streamed replies"""
+    global _streaming_llm
+    with _llm_lock:
+        if _streaming_llm is None:
+            with startup_profile.phase("openai_import"):
+                from openai import AsyncOpenAI
+            _streaming_llm = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    return _streaming_llm
+
+async def streaming_llm_ready():
+    if _streaming_llm is None:
+        await asyncio.to_thread(_load_streaming_llm)
+    return _streaming_llm
 
 # Pydantic Models
 class Recipe(BaseModel):
@@ -73,6 +499,30 @@ class MealPlanCreate(BaseModel):
     dinner: Optional[str] = None
     snacks: List[str] = Field(default_factory=list)
 
+class MealPlanUpdate(BaseModel):
+    breakfast: Optional[str] = None
+    lunch: Optional[str] = None
+    dinner: Optional[str] = None
+    snacks: Optional[List[str]] = None
+    add_snacks: List[str] = Field(default_factory=list)
+
+class MacroTargets(BaseModel):
+    calories: float
+    protein: Optional[float] = None
+    carbs: Optional[float] = None
+    fats: Optional[float] = None
+
+class GenerateMealPlanRequest(BaseModel):
+    start_date: str
+    days: int = Field(7, ge=1, le=31)
+    targets: MacroTargets
+    snacks_per_day: int = Field(0, ge=0, le=3)
+    slot_categories: Dict[str, List[str]] = Field(default_factory=dict)  # breakfast, lunch, dinner, snack
+    difficulties: Optional[List[str]] = None
+    allow_repeats: bool = False
+    beam_width: int = Field(20, ge=1, le=200)
+    save: bool = False
+
 class NutritionLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     date: str
@@ -102,6 +552,81 @@ class ChatRequest(BaseModel):
     session_id: str
     message: str
 
+class AiJobCreate(BaseModel):
+    kind: str = Field(..., pattern="^(chat|nutrition_analysis)$")
+    payload: Dict[str, Any]
+    priority: int = Field(0, ge=-10, le=10)  # Higher runs first
+
+# Indexes declared per collection and built on startup
+INDEX_SPECS = {
+    "recipes": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("difficulty", ASCENDING), ("id", ASCENDING)], name="category_difficulty_id"),
+        IndexModel([("prep_time", ASCENDING)], name="prep_time"),
+        IndexModel([("cook_time", ASCENDING)], name="cook_time"),
+        IndexModel([("nutrition.calories", ASCENDING)], name="calories"),
+    ],
+    "meal_plans": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("date", ASCENDING)], name="date_unique", unique=True),
+    ],
+    "nutrition_logs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+    "recipe_ingredients": [
+        IndexModel([("recipe_id", ASCENDING)], name="recipe_id_unique", unique=True),
+        IndexModel([("ingredients", ASCENDING)], name="ingredients"),
+    ],
+    "nutrition_daily_totals": [
+        IndexModel([("date", ASCENDING)], name="date_unique", unique=True),
+    ],
+    "recipe_changes": [
+        IndexModel([("version", ASCENDING)], name="version_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "recipe_imports": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "ai_analysis_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "chat_summaries": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+    ],
+    "versions": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+    ],
+    "migrations": [
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+    ],
+    "chat_history": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING)], name="session_timestamp"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "ai_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("priority", DESCENDING), ("created_at", ASCENDING)], name="status_priority_created"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+async def ensure_indexes():
+    """Create every index in INDEX_SPECS, logging (not raising) on conflicts"""
+    for collection_name, indexes in INDEX_SPECS.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            logger.error(f"Index creation failed for {collection_name}: {e}")
+
+MACROS = ("calories", "protein", "carbs", "fats")
+MAX_NUTRITION_LOG_BATCH = 500
+MAX_IMPORT_LINE_BYTES = 1_000_000
+MAX_IMPORT_ERRORS = 100
+MAX_MEAL_PLAN_RANGE_DAYS = 92
+
 # Helper functions
 def prepare_for_mongo(data):
     """Convert datetime objects to ISO strings for MongoDB storage"""
@@ -127,30 +652,1218 @@ def parse_from_mongo(item):
         item['timestamp'] = datetime.fromisoformat(item['timestamp'])
     return item
 
+def encode_cursor(last_value):
+    """Encode the last sort key of a page into an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps({"after": last_value}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising 400 if it is malformed"""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Both paged lists sort on string keys (recipe id, plan date)
+    if not isinstance(after, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+def requested_fields(fields, model):
+    """Turn a comma separated fields= parameter into the field names to fetch, or None for all"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return sorted(requested | {"id"})
+
+def model_fields(model):
+    """Exactly a model's fields, for responses that skip model validation"""
+    return list(model.model_fields)
+
+class FastJSONResponse(JSONResponse):
+    """Compact JSON response encoded with orjson when it is installed"""
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def fast_list_response(documents, next_cursor=None, etag=None):
+    """Return projected documents as stored: ISO timestamps pass through without a datetime round trip"""
+    headers = etag_headers(etag) if etag else {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(documents, headers=headers)
+
+def columnar(documents, fields):
+    """Compact list layout: the field names once, then one array of values per field"""
+    return {
+        "count": len(documents),
+        "columns": {field: [document.get(field) for document in documents] for field in fields},
+    }
+
+def parse_date_param(value, name):
+    """Parse an ISO date query parameter, raising 400 if it is malformed"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date: {value}")
+
+def require_mongo(feature):
+    """Reject features that are only implemented on MongoDB when running on the embedded backend"""
+    if db is None:
+        raise HTTPException(status_code=503, detail=f"{feature} require the mongo storage backend")
+
+def range_bounds(minimum, maximum):
+    """Inclusive (minimum, maximum) bounds for a storage range filter, or None when both are unset"""
+    if minimum is None and maximum is None:
+        return None
+    return (minimum, maximum)
+
+# Ingredient normalization and inverted index
+INGREDIENT_UNITS = {
+    "cup", "cups", "c", "tbsp", "tablespoon", "tablespoons", "tsp", "teaspoon", "teaspoons",
+    "oz", "ounce", "ounces", "lb", "lbs", "pound", "pounds", "g", "gram", "grams", "kg",
+    "kilogram", "kilograms", "ml", "milliliter", "milliliters", "l", "liter", "liters",
+    "pinch", "pinches", "dash", "dashes", "clove", "cloves", "can", "cans", "slice", "slices",
+    "piece", "pieces", "bunch", "bunches", "handful", "handfuls", "stick", "sticks",
+    "package", "packages", "pkg", "sprig", "sprigs", "quart", "quarts", "pint", "pints",
+}
+INGREDIENT_DESCRIPTORS = {
+    "chopped", "minced", "sliced", "diced", "melted", "grated", "shredded", "crushed",
+    "peeled", "juiced", "cubed", "fresh", "freshly", "finely", "roughly", "thinly",
+    "large", "medium", "small", "softened", "beaten", "optional", "of",
+}
+INGREDIENT_ARTICLES = {"a", "an"}
+# Nouns that end in s but are not plurals
+INVARIANT_NOUNS = {"molasses", "grits", "swiss", "series"}
+_QUANTITY_RE = re.compile(r"^[\d\s./\-½⅓⅔¼¾⅛]+(?:\bto\s+[\d./½⅓⅔¼¾⅛][\d\s./\-½⅓⅔¼¾⅛]*)?")
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_TRAILING_RE = re.compile(r",.*$|\bto taste\b.*$|\bfor serving\b.*$")
+
+def singularize(word):
+    """Cheap plural folding so 'eggs' and 'egg' land on the same term"""
+    if word in INVARIANT_NOUNS or word.endswith(("ss", "us")):
+        # glass, hummus, asparagus, couscous
+        return word
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("oes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+def ingredient_name(text):
+    """Reduce a free-text ingredient line like '2 cups all-purpose flour' to 'all-purpose flour', plurals kept"""
+    text = _PAREN_RE.sub(" ", text.lower())
+    text = _TRAILING_RE.sub("", text)
+    text = _QUANTITY_RE.sub("", text).strip()
+    words = text.replace("-", "- ").split()
+    while words and (
+        words[0].rstrip(".") in INGREDIENT_UNITS or words[0] in INGREDIENT_ARTICLES or _QUANTITY_RE.fullmatch(words[0])
+    ):
+        words.pop(0)
+    words = [word for word in words if word not in INGREDIENT_DESCRIPTORS]
+    return " ".join(words).replace("- ", "-").strip()
+
+# Part of every recipe fingerprint: bump it when normalize_ingredient() changes so persisted terms are recomputed
+INGREDIENT_NORMALIZER_VERSION = 3
+
+def normalize_ingredient(text):
+    """The index and shopping list match key: ingredient_name() with its last word singularized"""
+    words = ingredient_name(text).split(" ")
+    words[-1] = singularize(words[-1])
+    return " ".join(words)
+
+# Ingredient quantity parsing for shopping lists
+class ParsedIngredient(NamedTuple):
+    quantity: Optional[float]
+    unit: Optional[str]  # "ml", "g", a count unit such as "clove", or None for plain counts
+    item: str  # match key from normalize_ingredient()
+    name: str  # display name from ingredient_name()
+
+UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+UNIT_ALIASES = {
+    "cups": "cup", "c": "cup", "tablespoon": "tbsp", "tablespoons": "tbsp", "teaspoon": "tsp",
+    "teaspoons": "tsp", "ounce": "oz", "ounces": "oz", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "gram": "g", "grams": "g", "kilogram": "kg", "kilograms": "kg", "milliliter": "ml",
+    "milliliters": "ml", "liter": "l", "liters": "l", "quarts": "quart", "pints": "pint", "pkg": "package",
+}
+# Convertible units and their size in the base unit
+UNIT_CONVERSIONS = {
+    "cup": ("ml", 240.0), "tbsp": ("ml", 15.0), "tsp": ("ml", 5.0), "ml": ("ml", 1.0),
+    "l": ("ml", 1000.0), "quart": ("ml", 946.35), "pint": ("ml", 473.18),
+    "g": ("g", 1.0), "kg": ("g", 1000.0), "oz": ("g", 28.35), "lb": ("g", 453.59),
+}
+_LEADING_QUANTITY_RE = re.compile(
+    r"^\s*(\d+\s+\d+/\d+|\d+/\d+|\d*\.?\d+)(?:\s*(?:-|to)\s*(\d+\s+\d+/\d+|\d+/\d+|\d*\.?\d+))?\s*"
+)
+
+def parse_quantity(text):
+    """'1 1/2' -> 1.5, '3/4' -> 0.75, '2.5' -> 2.5; None for a zero denominator such as '1/0'"""
+    total = 0.0
+    for part in text.split():
+        numerator, _, denominator = part.partition("/")
+        if denominator and not float(denominator):
+            return None
+        total += float(numerator) / float(denominator) if denominator else float(numerator)
+    return total
+
+@functools.lru_cache(maxsize=50000)
+def parse_ingredient(text):
+    """Split a free-text line into quantity, unit and item, converting volumes to ml and weights to g"""
+    line = _PAREN_RE.sub(" ", text.lower())
+    for fraction, replacement in UNICODE_FRACTIONS.items():
+        line = line.replace(fraction, f" {replacement}")
+    quantity = None
+    match = _LEADING_QUANTITY_RE.match(line)
+    if match:
+        # For ranges like '2-3 cloves' buy the upper bound; a bad fraction leaves the line without a quantity
+        quantity = parse_quantity(match.group(2) or match.group(1))
+        line = line[match.end():]
+    else:
+        first, _, rest = line.strip().partition(" ")
+        if first in INGREDIENT_ARTICLES:
+            # 'a pinch of salt'
+            quantity = 1.0
+            line = rest
+    
+    unit = None
+    words = line.split(maxsplit=1)
+    if quantity is not None and words and words[0].rstrip(".") in INGREDIENT_UNITS:
+        word = words[0].rstrip(".")
+        unit = UNIT_ALIASES.get(word, singularize(word))
+        if unit in UNIT_CONVERSIONS:
+            unit, factor = UNIT_CONVERSIONS[unit]
+            quantity *= factor
+    return ParsedIngredient(quantity, unit, normalize_ingredient(text), ingredient_name(text))
+
+class IngredientIndex:
+    """In-memory inverted index from normalized ingredient to recipe ids"""
+
+    def __init__(self):
+        self.postings: Dict[str, set] = defaultdict(set)
+        self.token_terms: Dict[str, set] = defaultdict(set)
+        self.recipe_terms: Dict[str, set] = {}
+        self.sized: Dict[int, set] = defaultdict(set)  # ingredient count -> recipe ids, for ranking
+
+    def add(self, recipe_id, terms):
+        """Index (or re-index) a recipe under the given normalized terms"""
+        self.remove(recipe_id)
+        terms = set(terms)
+        self.recipe_terms[recipe_id] = terms
+        self.sized[len(terms)].add(recipe_id)
+        for term in terms:
+            self.postings[term].add(recipe_id)
+            for token in term.split():
+                self.token_terms[token].add(term)
+
+    def remove(self, recipe_id):
+        terms = self.recipe_terms.pop(recipe_id, None)
+        if terms is None:
+            return
+        self.sized[len(terms)].discard(recipe_id)
+        if not self.sized[len(terms)]:
+            del self.sized[len(terms)]
+        for term in terms:
+            recipe_ids = self.postings[term]
+            recipe_ids.discard(recipe_id)
+            if not recipe_ids:
+                del self.postings[term]
+                for token in term.split():
+                    self.token_terms[token].discard(term)
+                    if not self.token_terms[token]:
+                        del self.token_terms[token]
+
+    def expand(self, term):
+        """All indexed terms containing every token of term ('flour' -> 'all-purpose flour', ...)"""
+        tokens = term.split()
+        if not tokens:
+            return set()
+        candidates = set(self.token_terms.get(tokens[0], ()))
+        for token in tokens[1:]:
+            candidates &= self.token_terms.get(token, set())
+        if term in self.postings:
+            candidates.add(term)
+        return candidates
+
+    def search(self, terms, limit):
+        """Rank recipes by how many of the supplied terms they use, then by fewest unused ingredients"""
+        term_recipes = {}
+        for term in dict.fromkeys(terms):
+            # Only read from here on, so a single posting set is used as is rather than copied
+            postings = [self.postings[indexed_term] for indexed_term in self.expand(term)]
+            term_recipes[term] = postings[0] if len(postings) == 1 else set().union(*postings)
+        ranked = []
+        for bucket in self._match_buckets(list(term_recipes.values())):
+            # Within a bucket fewest unused ingredients means fewest ingredients, so walk the size
+            # groups upwards and stop once limit recipes are taken instead of sorting every match
+            for size in sorted(self.sized):
+                if len(ranked) >= limit:
+                    return ranked
+                for recipe_id in sorted(bucket & self.sized[size])[:limit - len(ranked)]:
+                    ranked.append((recipe_id, [term for term, recipe_ids in term_recipes.items() if recipe_id in recipe_ids]))
+        return ranked
+
+    @staticmethod
+    def _match_buckets(term_recipes):
+        """Sets of recipe ids using the same number of terms, most matches first
+
+        Recipes using every term come from one intersection; the per-recipe count is only
+        needed when those do not fill the page, since staples like salt match nearly everything.
+        """
+        if len(term_recipes) < 2:
+            yield term_recipes[0] if term_recipes else set()
+            return
+        yield set.intersection(*sorted(term_recipes, key=len))
+        counts = Counter(chain.from_iterable(term_recipes))
+        for count in range(len(term_recipes) - 1, 0, -1):
+            yield {recipe_id for recipe_id, matches in counts.items() if matches == count}
+
+ingredient_index = IngredientIndex()
+
+def ingredient_terms(ingredients):
+    return sorted({term for term in map(normalize_ingredient, ingredients) if term})
+
+# The recipe fields the ingredient index and recipe matrix are built from
+RECIPE_INDEX_FIELDS = ["id", "ingredients", "nutrition", "category", "difficulty"]
+
+def recipe_fingerprint(recipe):
+    """Checksum of a recipe's RECIPE_INDEX_FIELDS and the normalizer version, to tell whether derived entries are still current"""
+    source = [INGREDIENT_NORMALIZER_VERSION, *(recipe.get(field) for field in RECIPE_INDEX_FIELDS)]
+    return hashlib.sha1(json.dumps(source, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+async def index_recipe_ingredients(recipe):
+    """Update the in-memory index and its persisted copy for one recipe"""
+    terms = ingredient_terms(recipe["ingredients"])
+    ingredient_index.add(recipe["id"], terms)
+    await storage.recipes.save_ingredient_terms({recipe["id"]: (recipe_fingerprint(recipe), terms)})
+
+async def index_new_recipes_ingredients(recipes):
+    """Bulk variant of index_recipe_ingredients for recipes that have just been inserted"""
+    terms_by_recipe = {}
+    for recipe in recipes:
+        terms = ingredient_terms(recipe["ingredients"])
+        ingredient_index.add(recipe["id"], terms)
+        terms_by_recipe[recipe["id"]] = (recipe_fingerprint(recipe), terms)
+    await storage.recipes.save_ingredient_terms(terms_by_recipe, new=True)
+
+async def unindex_recipe_ingredients(recipe_id):
+    ingredient_index.remove(recipe_id)
+    await storage.recipes.delete_ingredient_terms([recipe_id])
+
+# Recipe feature matrix for meal plan generation and similar recipes
+SIMILARITY_INGREDIENT_DIM = 128
+SIMILARITY_DIFFICULTY_DIM = 4
+SIMILARITY_FEATURE_DIM = SIMILARITY_INGREDIENT_DIM + SIMILARITY_DIFFICULTY_DIM + len(MACROS)
+SIMILARITY_WEIGHTS = {"ingredients": 1.0, "difficulty": 0.3, "nutrition": 0.5}
+# Typical per-serving magnitudes used to put macros on a comparable scale
+NUTRITION_SCALES = np.array([500.0, 30.0, 60.0, 20.0])
+
+def ingredient_idf(document_frequency, recipe_count):
+    return np.log((1 + recipe_count) / (1 + document_frequency)) + 1
+
+def recipe_features(terms, document_frequencies, recipe_count, difficulty_code, macros):
+    """Unit feature vector: hashed IDF-weighted ingredients, difficulty one-hot and log-scaled macros"""
+    ingredients = np.zeros(SIMILARITY_INGREDIENT_DIM, dtype=np.float32)
+    for term in terms:
+        bucket = zlib.crc32(term.encode()) % SIMILARITY_INGREDIENT_DIM
+        ingredients[bucket] += ingredient_idf(document_frequencies.get(term, 0), recipe_count)
+    norm = np.linalg.norm(ingredients)
+    if norm:
+        ingredients /= norm
+    difficulty = np.zeros(SIMILARITY_DIFFICULTY_DIM, dtype=np.float32)
+    difficulty[difficulty_code % SIMILARITY_DIFFICULTY_DIM] = 1.0
+    nutrition = np.log1p(np.maximum(macros, 0) / NUTRITION_SCALES).astype(np.float32)
+    norm = np.linalg.norm(nutrition)
+    if norm:
+        nutrition /= norm
+    features = np.concatenate([
+        SIMILARITY_WEIGHTS["ingredients"] * ingredients,
+        SIMILARITY_WEIGHTS["difficulty"] * difficulty,
+        SIMILARITY_WEIGHTS["nutrition"] * nutrition,
+    ])
+    return features / np.linalg.norm(features)
+
+class RecipeMatrix:
+    """Dense NumPy view of every recipe's macros, category, difficulty and similarity features.
+
+    Rows are updated in place on recipe writes; deletes move the last row into the
+    freed slot so the live rows stay contiguous and masks stay cheap to compute.
+    """
+    columns = ("macros", "category_codes", "difficulty_codes", "features")
+
+    def __init__(self, capacity=1024):
+        self.ids = []
+        self.rows = {}
+        self.macros = np.zeros((capacity, len(MACROS)))
+        self.category_codes = np.zeros(capacity, dtype=np.int32)
+        self.difficulty_codes = np.zeros(capacity, dtype=np.int32)
+        self.features = np.zeros((capacity, SIMILARITY_FEATURE_DIM), dtype=np.float32)
+        self.categories = {}
+        self.difficulties = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _code(self, codes, value):
+        return codes.setdefault(value, len(codes))
+
+    def upsert(self, recipe, with_features=True):
+        row = self.rows.get(recipe["id"])
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.macros):
+                for column in self.columns:
+                    array = getattr(self, column)
+                    setattr(self, column, np.concatenate([array, np.zeros_like(array)]))
+            self.ids.append(recipe["id"])
+            self.rows[recipe["id"]] = row
+        self.macros[row] = [recipe["nutrition"].get(macro, 0) for macro in MACROS]
+        self.category_codes[row] = self._code(self.categories, recipe["category"])
+        self.difficulty_codes[row] = self._code(self.difficulties, recipe["difficulty"])
+        if not with_features:
+            return
+        self.features[row] = recipe_features(
+            ingredient_index.recipe_terms.get(recipe["id"], ()),
+            {term: len(ingredient_index.postings.get(term, ())) for term in ingredient_index.recipe_terms.get(recipe["id"], ())},
+            len(ingredient_index.recipe_terms),
+            self.difficulty_codes[row],
+            self.macros[row],
+        )
+
+    def remove(self, recipe_id):
+        row = self.rows.pop(recipe_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        last_id = self.ids.pop()
+        if row != last:
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+            for column in self.columns:
+                array = getattr(self, column)
+                array[row] = array[last]
+
+    def mask(self, categories=None, difficulties=None):
+        """Boolean mask over live rows matching any of the given categories and difficulties"""
+        size = len(self.ids)
+        mask = np.ones(size, dtype=bool)
+        if categories is not None:
+            codes = [self.categories[name] for name in categories if name in self.categories]
+            mask &= np.isin(self.category_codes[:size], codes)
+        if difficulties is not None:
+            codes = [self.difficulties[name] for name in difficulties if name in self.difficulties]
+            mask &= np.isin(self.difficulty_codes[:size], codes)
+        return mask
+
+recipe_matrix = RecipeMatrix()
+
+SIMILAR_RECIPES_MAX_K = 20
+SIMILARITY_BLOCK_SIZE = 1024
+SIMILARITY_REBUILD_AFTER_WRITES = 1000
+SIMILARITY_INCREMENTAL_BATCH_LIMIT = 100
+
+def compute_neighbors(features, category_codes, k):
+    """Top-k cosine neighbours of every row among rows of the same category, in row blocks"""
+    neighbors = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))] * len(features)
+    for code in np.unique(category_codes):
+        members = np.flatnonzero(category_codes == code)
+        count = min(k, len(members) - 1)
+        if count <= 0:
+            continue
+        member_features = features[members]
+        for start in range(0, len(members), SIMILARITY_BLOCK_SIZE):
+            # Negated in place so partitioning needs no extra copy of the block
+            distances = member_features[start:start + SIMILARITY_BLOCK_SIZE] @ member_features.T
+            distances *= -1
+            block_rows = np.arange(len(distances))
+            distances[block_rows, start + block_rows] = np.inf
+            top = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = -np.take_along_axis(top_distances, order, axis=1)
+            for offset in block_rows:
+                neighbors[members[start + offset]] = (members[top[offset]], top_scores[offset])
+    return neighbors
+
+class SimilarityIndex:
+    """Precomputed top-k similar recipes per recipe, kept current between full rebuilds.
+
+    Neighbours are drawn from the same category. Writes update the written recipe's
+    list and offer it to its closest peers; deletes refill the lists that pointed
+    at the removed recipe. Full rebuilds (which also refresh IDF weights) run in a
+    worker thread once enough writes have accumulated.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.neighbors = {}
+        self.referenced_by = defaultdict(set)
+        self.writes_since_rebuild = 0
+        self.last_rebuild_seconds = None
+        # Startup loads recipes without feature vectors, so lists are arbitrary until the first rebuild fills them in
+        self.ready = False
+        self._changed_during_rebuild = None
+        self._rebuild_task = None
+
+    def _set(self, recipe_id, neighbor_ids, scores):
+        for neighbor_id in self.neighbors.get(recipe_id, ((), None))[0]:
+            self.referenced_by[neighbor_id].discard(recipe_id)
+        self.neighbors[recipe_id] = (tuple(neighbor_ids), np.asarray(scores, dtype=np.float32))
+        for neighbor_id in neighbor_ids:
+            self.referenced_by[neighbor_id].add(recipe_id)
+
+    def _query(self, recipe_id, count):
+        """Closest `count` same-category recipes, scored against the live matrix"""
+        size = len(recipe_matrix)
+        row = recipe_matrix.rows[recipe_id]
+        members = np.flatnonzero(recipe_matrix.category_codes[:size] == recipe_matrix.category_codes[row])
+        members = members[members != row]
+        if not len(members):
+            return [], np.zeros(0, dtype=np.float32)
+        scores = recipe_matrix.features[members] @ recipe_matrix.features[row]
+        count = min(count, len(members))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [recipe_matrix.ids[member] for member in members[top]], scores[top]
+
+    def _offer(self, peer_id, recipe_id, score):
+        if peer_id not in self.neighbors:
+            # Not computed yet; similar() will build the full list on demand
+            return
+        neighbor_ids, scores = self.neighbors[peer_id]
+        if recipe_id in neighbor_ids:
+            # Offered again after an update: drop the old entry so it is placed by its new score
+            index = neighbor_ids.index(recipe_id)
+            neighbor_ids = neighbor_ids[:index] + neighbor_ids[index + 1:]
+            scores = np.delete(scores, index)
+        if len(neighbor_ids) >= self.k and score <= scores[-1]:
+            return
+        position = int(np.searchsorted(-scores, -score))
+        self._set(
+            peer_id,
+            (neighbor_ids[:position] + (recipe_id,) + neighbor_ids[position:])[:self.k],
+            np.insert(scores, position, score)[:self.k],
+        )
+
+    def insert(self, recipe_id):
+        if self._changed_during_rebuild is not None:
+            self._changed_during_rebuild.add(recipe_id)
+        neighbor_ids, scores = self._query(recipe_id, 2 * self.k)
+        self._set(recipe_id, neighbor_ids[:self.k], scores[:self.k])
+        for peer_id, score in zip(neighbor_ids, scores):
+            self._offer(peer_id, recipe_id, float(score))
+
+    def remove(self, recipe_id):
+        if self._changed_during_rebuild is not None:
+            self._changed_during_rebuild.add(recipe_id)
+        self._set(recipe_id, (), ())
+        del self.neighbors[recipe_id]
+        for peer_id in self.referenced_by.pop(recipe_id, set()):
+            if peer_id in recipe_matrix.rows:
+                self._set(peer_id, *self._query(peer_id, self.k))
+
+    def note_writes(self, count):
+        self.writes_since_rebuild += count
+        if self.writes_since_rebuild >= max(SIMILARITY_REBUILD_AFTER_WRITES, len(recipe_matrix) // 10):
+            self.schedule_rebuild()
+
+    def similar(self, recipe_id, k):
+        if recipe_id not in self.neighbors:
+            self._set(recipe_id, *self._query(recipe_id, self.k))
+        neighbor_ids, scores = self.neighbors[recipe_id]
+        return list(zip(neighbor_ids[:k], scores[:k].tolist()))
+
+    def schedule_rebuild(self):
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.create_task(self.rebuild())
+
+    async def rebuild(self):
+        """Refresh every feature vector and recompute all neighbour lists off the event loop"""
+        started = time_module.perf_counter()
+        self.writes_since_rebuild = 0
+        self._changed_during_rebuild = set()
+        size = len(recipe_matrix)
+        ids = list(recipe_matrix.ids)
+        terms = [ingredient_index.recipe_terms.get(recipe_id, ()) for recipe_id in ids]
+        document_frequencies = {term: len(recipe_ids) for term, recipe_ids in ingredient_index.postings.items()}
+        difficulty_codes = recipe_matrix.difficulty_codes[:size].copy()
+        category_codes = recipe_matrix.category_codes[:size].copy()
+        macros = recipe_matrix.macros[:size].copy()
+        
+        def build():
+            features = np.array(
+                [recipe_features(terms[row], document_frequencies, size, difficulty_codes[row], macros[row]) for row in range(size)],
+                dtype=np.float32,
+            ).reshape(size, SIMILARITY_FEATURE_DIM)
+            return features, compute_neighbors(features, category_codes, self.k)
+        
+        try:
+            features, neighbors = await asyncio.get_running_loop().run_in_executor(None, build)
+        except Exception:
+            self._changed_during_rebuild = None
+            raise
+        changed, self._changed_during_rebuild = self._changed_during_rebuild, None
+        
+        self.neighbors = {}
+        self.referenced_by = defaultdict(set)
+        for row, recipe_id in enumerate(ids):
+            if recipe_id in changed or recipe_id not in recipe_matrix.rows:
+                continue
+            recipe_matrix.features[recipe_matrix.rows[recipe_id]] = features[row]
+            neighbor_rows, scores = neighbors[row]
+            neighbor_ids = [ids[neighbor_row] for neighbor_row in neighbor_rows]
+            if not changed.intersection(neighbor_ids):
+                self._set(recipe_id, neighbor_ids, scores)
+        # Writes that landed while the worker thread ran are replayed on the fresh index
+        for recipe_id in changed:
+            if recipe_id in recipe_matrix.rows:
+                self.insert(recipe_id)
+        self.ready = True
+        self.last_rebuild_seconds = round(time_module.perf_counter() - started, 3)
+        logger.info(f"Rebuilt similar-recipe index for {size} recipes in {self.last_rebuild_seconds}s")
+
+similarity_index = SimilarityIndex(SIMILAR_RECIPES_MAX_K)
+
+async def load_recipe_indexes():
+    """Build the ingredient index and recipe matrix in one pass over the recipes.
+
+    Persisted ingredient terms are reused for recipes whose fingerprint still
+    matches; the rest are normalized again and their persisted copy replaced.
+    """
+    persisted = await storage.recipes.load_ingredient_terms()
+    # Read before the scan, so writes that land during it are picked up by the next sync poll
+    recipe_index_sync.version, = await storage.versions.get(["recipes"])
+    stale = {}
+    async for recipe in storage.recipes.iterate(RECIPE_INDEX_FIELDS):
+        fingerprint = recipe_fingerprint(recipe)
+        persisted_fingerprint, terms = persisted.pop(recipe["id"], (None, None))
+        if persisted_fingerprint != fingerprint:
+            terms = ingredient_terms(recipe["ingredients"])
+            stale[recipe["id"]] = (fingerprint, terms)
+        ingredient_index.add(recipe["id"], terms)
+        # Features are filled in by the similarity rebuild scheduled right after loading
+        recipe_matrix.upsert(recipe, with_features=False)
+        recipe_index_sync.fingerprints[recipe["id"]] = fingerprint
+    if stale:
+        await storage.recipes.save_ingredient_terms(stale)
+        logger.info(f"Re-indexed ingredients of {len(stale)} recipes")
+    if persisted:
+        await storage.recipes.delete_ingredient_terms(list(persisted))
+
+# Recipe cache
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire ttl seconds after they are set"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time_module.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time_module.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class LocalRecipeCacheBackend:
+    """Per-process backend; other workers see writes once their entries expire"""
+    name = "local"
+
+    def __init__(self, maxsize, ttl):
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get(self, recipe_id):
+        return self._cache.get(recipe_id)
+
+    async def get_many(self, recipe_ids):
+        return [self._cache.get(recipe_id) for recipe_id in recipe_ids]
+
+    async def set(self, recipe_id, recipe):
+        self._cache.set(recipe_id, recipe)
+
+    async def delete(self, recipe_id):
+        self._cache.delete(recipe_id)
+
+    async def size(self):
+        return len(self._cache)
+
+class RedisRecipeCacheBackend:
+    """Shared backend so invalidations are seen by every worker; size is bounded by Redis maxmemory"""
+    name = "redis"
+
+    def __init__(self, url, ttl):
+        self._redis = redis_asyncio.from_url(url)
+        self._ttl = ttl
+
+    async def get(self, recipe_id):
+        value = await self._redis.get(f"recipe:{recipe_id}")
+        return json.loads(value) if value is not None else None
+
+    async def get_many(self, recipe_ids):
+        values = await self._redis.mget([f"recipe:{recipe_id}" for recipe_id in recipe_ids])
+        return [json.loads(value) if value is not None else None for value in values]
+
+    async def set(self, recipe_id, recipe):
+        await self._redis.set(f"recipe:{recipe_id}", json.dumps(recipe, default=str), ex=int(self._ttl))
+
+    async def delete(self, recipe_id):
+        await self._redis.delete(f"recipe:{recipe_id}")
+
+    async def size(self):
+        return None
+
+class RecipeCache:
+    """Read-through cache of raw recipe documents with hit/miss counters
+
+    Entries are stored as {"version": ..., "recipe": ...} so a reader holding the document's
+    version counter can tell when another worker has replaced the document since it was cached.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, recipe_id, version=None):
+        """Return a copy of the recipe document, loading it from storage on a miss
+
+        With a version, an entry cached at any other version is a miss and is replaced; read the
+        version before calling so the document loaded is at least as new as the version it is cached at.
+        """
+        entry = await self.backend.get(recipe_id)
+        if entry is not None and (version is None or entry["version"] == version):
+            self.hits += 1
+            return dict(entry["recipe"])
+        self.misses += 1
+        recipe = await storage.recipes.get(recipe_id)
+        if recipe is not None:
+            await self.backend.set(recipe_id, {"version": version, "recipe": recipe})
+            return dict(recipe)
+        return None
+
+    async def get_many(self, recipe_ids):
+        """Return {id: recipe copy} for the ids that exist, loading all misses with one query"""
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if not recipe_ids:
+            return {}
+        cached = await self.backend.get_many(recipe_ids)
+        recipes = {recipe_id: dict(entry["recipe"]) for recipe_id, entry in zip(recipe_ids, cached) if entry is not None}
+        missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in recipes]
+        self.hits += len(recipes)
+        self.misses += len(missing)
+        if missing:
+            for recipe in await storage.recipes.get_many(missing):
+                await self.backend.set(recipe["id"], {"version": None, "recipe": recipe})
+                recipes[recipe["id"]] = dict(recipe)
+        return recipes
+
+    async def invalidate(self, recipe_id):
+        await self.backend.delete(recipe_id)
+
+    async def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "size": await self.backend.size(),
+            "max_size": RECIPE_CACHE_SIZE,
+            "ttl_seconds": RECIPE_CACHE_TTL,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+def create_recipe_cache_backend():
+    if RECIPE_CACHE_REDIS_URL:
+        if redis_asyncio is not None:
+            return RedisRecipeCacheBackend(RECIPE_CACHE_REDIS_URL, RECIPE_CACHE_TTL)
+        logging.error("RECIPE_CACHE_REDIS_URL is set but the redis package is not installed; using the local cache")
+    return LocalRecipeCacheBackend(RECIPE_CACHE_SIZE, RECIPE_CACHE_TTL)
+
+recipe_cache = RecipeCache(create_recipe_cache_backend())
+
+# Derived recipe indexes are kept current from these hooks
+async def bump_recipe_versions(recipe_ids):
+    """Bump the document counters, then the collection counter, and log which recipes that numbered write touched"""
+    recipe_ids = list(recipe_ids)
+    await storage.versions.bump([f"recipe:{recipe_id}" for recipe_id in recipe_ids])
+    version = await storage.versions.increment("recipes")
+    recipe_index_sync.wrote(version)
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=RECIPE_CHANGE_LOG_TTL)
+    await storage.recipes.log_change(version, recipe_ids, expires_at)
+
+async def recipes_inserted(recipes):
+    if recipes:
+        await bump_recipe_versions(recipe["id"] for recipe in recipes)
+    await index_new_recipes_ingredients(recipes)
+    for recipe in recipes:
+        recipe_index_sync.recorded(recipe)
+        recipe_matrix.upsert(recipe)
+    # Large imports are left to the next full similarity rebuild
+    if len(recipes) <= SIMILARITY_INCREMENTAL_BATCH_LIMIT:
+        for recipe in recipes:
+            similarity_index.insert(recipe["id"])
+    similarity_index.note_writes(len(recipes))
+
+async def recipe_replaced(recipe):
+    await bump_recipe_versions([recipe["id"]])
+    recipe_index_sync.recorded(recipe)
+    await index_recipe_ingredients(recipe)
+    recipe_matrix.upsert(recipe)
+    similarity_index.remove(recipe["id"])
+    similarity_index.insert(recipe["id"])
+    similarity_index.note_writes(1)
+    parsed_recipe_ingredients.delete(recipe["id"])
+
+async def recipe_deleted(recipe_id):
+    await bump_recipe_versions([recipe_id])
+    recipe_index_sync.forget(recipe_id)
+    await unindex_recipe_ingredients(recipe_id)
+    recipe_matrix.remove(recipe_id)
+    similarity_index.remove(recipe_id)
+    similarity_index.note_writes(1)
+    parsed_recipe_ingredients.delete(recipe_id)
+
+class RecipeIndexSync:
+    """Brings this worker's ingredient index, recipe matrix and similar-recipe lists up to date with
+    recipe writes made by other workers.
+
+    Every recipe write takes the next value of the shared "recipes" counter and
+    logs it with the ids it touched in the recipe change log. A poll reads the
+    log past the last value it has applied and re-indexes only those recipes,
+    skipping values this worker wrote itself. A counter value that stays
+    missing from the log for RECIPE_INDEX_SYNC_GAP_TIMEOUT seconds (a writer
+    that died in between, or an entry that expired) falls back to rescanning
+    every recipe and re-indexing the ones whose fingerprint changed.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.version = 0  # every counter value up to here is applied
+        self.fingerprints = {}
+        self.applied = set()  # counter values above version already applied, our own writes included
+        self.refreshes = 0
+        self.full_refreshes = 0
+        self.last_refresh_seconds = None
+        self._gap_since = None
+        self._written_during_refresh = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def wrote(self, version):
+        self.applied.add(version)
+
+    def recorded(self, recipe):
+        self.fingerprints[recipe["id"]] = recipe_fingerprint(recipe)
+        if self._written_during_refresh is not None:
+            self._written_during_refresh.add(recipe["id"])
+
+    def forget(self, recipe_id):
+        self.fingerprints.pop(recipe_id, None)
+        if self._written_during_refresh is not None:
+            self._written_during_refresh.add(recipe_id)
+
+    async def poll(self):
+        """Re-index the recipes written by other workers since the last poll"""
+        async with self._lock:
+            # Read before the log, so every value up to current is either logged or still in flight
+            current, = await storage.versions.get(["recipes"])
+            changes = await storage.recipes.list_changes(self.version)
+            recipe_ids = {
+                recipe_id for change in changes if change["version"] not in self.applied for recipe_id in change["recipe_ids"]
+            }
+            if recipe_ids:
+                await self.refresh(recipe_ids)
+            self.applied.update(change["version"] for change in changes)
+            while self.version + 1 in self.applied:
+                self.version += 1
+                self.applied.discard(self.version)
+            if self.version >= current:
+                self._gap_since = None
+            elif self._gap_since is None:
+                self._gap_since = time_module.monotonic()
+            elif time_module.monotonic() - self._gap_since > RECIPE_INDEX_SYNC_GAP_TIMEOUT:
+                logging.error(f"Recipe write {self.version + 1} never reached the change log; rescanning every recipe")
+                await self.refresh()
+                self.version = max(current, *self.applied)
+                self.applied = set()
+                self._gap_since = None
+
+    async def _fetch(self, recipe_ids):
+        if recipe_ids is None:
+            async for recipe in storage.recipes.iterate(RECIPE_INDEX_FIELDS):
+                yield recipe
+        else:
+            for recipe in await storage.recipes.get_many(recipe_ids, RECIPE_INDEX_FIELDS):
+                yield recipe
+
+    async def refresh(self, recipe_ids=None):
+        """Re-index the given recipes, or every recipe, whose fingerprint differs from the local copy"""
+        started = time_module.perf_counter()
+        self._written_during_refresh = set()
+        seen = set()
+        changed = []
+        try:
+            async for recipe in self._fetch(recipe_ids):
+                seen.add(recipe["id"])
+                fingerprint = recipe_fingerprint(recipe)
+                if recipe["id"] in self._written_during_refresh or self.fingerprints.get(recipe["id"]) == fingerprint:
+                    continue
+                self.fingerprints[recipe["id"]] = fingerprint
+                ingredient_index.add(recipe["id"], ingredient_terms(recipe["ingredients"]))
+                recipe_matrix.upsert(recipe)
+                changed.append(recipe["id"])
+            candidates = set(self.fingerprints) if recipe_ids is None else set(recipe_ids) & set(self.fingerprints)
+            removed = candidates - seen - self._written_during_refresh
+        finally:
+            self._written_during_refresh = None
+        for recipe_id in removed:
+            del self.fingerprints[recipe_id]
+            ingredient_index.remove(recipe_id)
+            recipe_matrix.remove(recipe_id)
+            similarity_index.remove(recipe_id)
+        if len(changed) <= SIMILARITY_INCREMENTAL_BATCH_LIMIT:
+            for recipe_id in changed:
+                similarity_index.remove(recipe_id)
+                similarity_index.insert(recipe_id)
+        else:
+            similarity_index.schedule_rebuild()
+        similarity_index.note_writes(len(changed) + len(removed))
+        for recipe_id in (*changed, *removed):
+            parsed_recipe_ingredients.delete(recipe_id)
+            await recipe_cache.invalidate(recipe_id)
+        self.refreshes += 1
+        if recipe_ids is None:
+            self.full_refreshes += 1
+        self.last_refresh_seconds = round(time_module.perf_counter() - started, 3)
+        if changed or removed:
+            logger.info(f"Synced {len(changed)} changed and {len(removed)} removed recipes written by other workers")
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logging.error(f"Recipe index sync failed: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval,
+            "version": self.version,
+            "refreshes": self.refreshes,
+            "full_refreshes": self.full_refreshes,
+            "last_refresh_seconds": self.last_refresh_seconds,
+        }
+
+recipe_index_sync = RecipeIndexSync(RECIPE_INDEX_SYNC_INTERVAL)
+
+# Conditional GETs
+#
+# Every write bumps a counter for its collection and one for the document, so
+# a GET can compare If-None-Match against its ETag before loading anything.
+def meal_plan_version_keys(dates):
+    return ["meal_plans", *(f"meal_plan:{day}" for day in dates)]
+
+def etag_headers(etag):
+    # no-cache: clients may store the response but must revalidate it on every use
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+def matching_etag(if_none_match, etag):
+    """The client's tag that matches etag or one of its compressed variants, or None.
+
+    If-None-Match uses the weak comparison, so a W/ prefix on the client's tag is ignored.
+    """
+    variants = {etag, *(f'{etag[:-1]}-{encoding}"' for encoding in COMPRESSION_ENCODINGS)}
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag in variants:
+            return tag
+    return None
+
+async def check_not_modified(request, keys):
+    """Strong ETag from the version counters of keys and the query string; returns (etag, 304 response or None)"""
+    return versions_not_modified(request, await storage.versions.get(keys))
+
+def versions_not_modified(request, versions):
+    """check_not_modified for version counters the caller has already read"""
+    query = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    tag = ".".join(map(str, versions))
+    if storage.versions.epoch:
+        tag = f"{storage.versions.epoch}:{tag}"
+    etag = f'"{tag}-{query}"'
+    matched = matching_etag(request.headers.get("if-none-match", ""), etag)
+    if matched:
+        # Echo the variant the client holds, which may carry a compression suffix
+        return etag, Response(status_code=304, headers=etag_headers(matched))
+    return etag, None
+
 # Recipe Routes
 @api_router.post("/recipes", response_model=Recipe)
 async def create_recipe(recipe_data: RecipeCreate):
     recipe = Recipe(**recipe_data.dict())
     recipe_dict = prepare_for_mongo(recipe.dict())
-    await db.recipes.insert_one(recipe_dict)
+    await storage.recipes.insert(recipe_dict)
+    await recipes_inserted([recipe_dict])
     return recipe
 
-@api_router.get("/recipes", response_model=List[Recipe])
-async def get_recipes(category: Optional[str] = None, difficulty: Optional[str] = None):
-    filter_query = {}
+@api_router.get("/recipes")
+async def get_recipes(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = None,
+    min_prep_time: Optional[int] = None,
+    max_prep_time: Optional[int] = None,
+    min_cook_time: Optional[int] = None,
+    max_cook_time: Optional[int] = None,
+    min_calories: Optional[float] = None,
+    max_calories: Optional[float] = None,
+    fast: bool = False,
+    format: str = Query("objects", pattern="^(objects|columns)$"),
+):
+    """List recipes ordered by id; the next page's cursor is sent in the X-Next-Cursor header.
+
+    fast=true skips model validation and returns the projected documents as stored.
+    format=columns does the same but sends the page as columnar() arrays.
+    """
+    etag, not_modified = await check_not_modified(request, ["recipes"])
+    if not_modified:
+        return not_modified
+    equals = {}
     if category:
-        filter_query["category"] = category
+        equals["category"] = category
     if difficulty:
-        filter_query["difficulty"] = difficulty
+        equals["difficulty"] = difficulty
+    ranges = {}
+    for field, bounds in (
+        ("prep_time", range_bounds(min_prep_time, max_prep_time)),
+        ("cook_time", range_bounds(min_cook_time, max_cook_time)),
+        ("nutrition.calories", range_bounds(min_calories, max_calories)),
+    ):
+        if bounds:
+            ranges[field] = bounds
+    after = decode_cursor(cursor) if cursor else None
     
-    recipes = await db.recipes.find(filter_query).to_list(100)
+    as_stored = fast or format == "columns"
+    projection = requested_fields(fields, Recipe) if fields or not as_stored else model_fields(Recipe)
+    recipes = await storage.recipes.list(equals, ranges, after, limit + 1, projection)
+    next_cursor = None
+    if len(recipes) > limit:
+        recipes = recipes[:limit]
+        next_cursor = encode_cursor(recipes[-1]["id"])
+    if format == "columns":
+        return fast_list_response(columnar(recipes, projection), next_cursor, etag)
+    if fast:
+        return fast_list_response(recipes, next_cursor, etag)
+    response.headers.update(etag_headers(etag))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if fields:
+        return [parse_from_mongo(recipe) for recipe in recipes]
     return [Recipe(**parse_from_mongo(recipe)) for recipe in recipes]
 
+async def insert_recipe_chunk(chunk, line_numbers):
+    """Insert one import chunk unordered; return the line numbers whose insert failed"""
+    failed = {line_numbers[index]: message for index, message in (await storage.recipes.insert_many(chunk)).items()}
+    await recipes_inserted([
+        recipe for recipe, line_number in zip(chunk, line_numbers) if line_number not in failed
+    ])
+    return failed
+
+def iter_ndjson_lines(buffer, final=False):
+    """Split complete lines off the front of buffer, leaving any partial line in place"""
+    if final:
+        lines = [bytes(buffer)] if buffer else []
+        buffer.clear()
+        return lines
+    lines = buffer.split(b"\n")
+    buffer[:] = lines.pop()
+    return lines
+
+def describe_validation_error(error):
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+
+@api_router.post("/recipes/import")
+async def import_recipes(request: Request, chunk_size: int = Query(1000, ge=1, le=10000)):
+    """Stream an NDJSON (optionally gzip) body of RecipeCreate objects into the catalog in chunks"""
+    import_id = str(uuid.uuid4())
+    progress = {"lines": 0, "imported": 0, "failed": 0}
+    await storage.recipes.create_import(prepare_for_mongo({
+        "id": import_id,
+        "status": "running",
+        **progress,
+        "errors": [],
+        "started_at": datetime.now(timezone.utc),
+    }))
+    
+    async def record(chunk_errors, **fields):
+        await storage.recipes.update_import(import_id, {**progress, **fields}, chunk_errors, MAX_IMPORT_ERRORS)
+    
+    decompressor = None
+    if "gzip" in request.headers.get("content-encoding", "") or "gzip" in request.headers.get("content-type", ""):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    buffer = bytearray()
+    chunk, line_numbers, chunk_errors = [], [], []
+    
+    async def flush():
+        nonlocal chunk, line_numbers, chunk_errors
+        if chunk:
+            failed = await insert_recipe_chunk(chunk, line_numbers)
+            progress["imported"] += len(chunk) - len(failed)
+            progress["failed"] += len(failed)
+            chunk_errors.extend({"line": line, "error": message} for line, message in failed.items())
+        await record(chunk_errors)
+        chunk, line_numbers, chunk_errors = [], [], []
+    
+    def handle_line(line):
+        progress["lines"] += 1
+        if not line.strip():
+            return
+        try:
+            recipe = Recipe(**RecipeCreate(**json.loads(line)).dict())
+        except (ValueError, TypeError) as e:
+            progress["failed"] += 1
+            message = describe_validation_error(e) if isinstance(e, ValidationError) else str(e)
+            chunk_errors.append({"line": progress["lines"], "error": message})
+            return
+        chunk.append(prepare_for_mongo(recipe.dict()))
+        line_numbers.append(progress["lines"])
+    
+    try:
+        async for data in request.stream():
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            buffer.extend(data)
+            for line in iter_ndjson_lines(buffer):
+                handle_line(line)
+                if len(chunk) >= chunk_size:
+                    await flush()
+            if len(buffer) > MAX_IMPORT_LINE_BYTES:
+                raise ValueError(f"Line {progress['lines'] + 1} exceeds {MAX_IMPORT_LINE_BYTES} bytes")
+        if decompressor is not None:
+            buffer.extend(decompressor.flush())
+        for line in iter_ndjson_lines(buffer, final=True):
+            handle_line(line)
+        await flush()
+    except (ValueError, zlib.error) as e:
+        await record([], status="failed", error=str(e), finished_at=datetime.now(timezone.utc).isoformat())
+        raise HTTPException(status_code=400, detail=f"Import {import_id} aborted: {e}")
+    
+    await record([], status="completed", finished_at=datetime.now(timezone.utc).isoformat())
+    return await get_recipe_import(import_id)
+
+@api_router.get("/recipes/import/{import_id}")
+async def get_recipe_import(import_id: str):
+    """Progress and the first MAX_IMPORT_ERRORS line failures of an import"""
+    recipe_import = await storage.recipes.get_import(import_id)
+    if not recipe_import:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return recipe_import
+
+@api_router.get("/recipes/search/by-ingredients")
+async def search_recipes_by_ingredients(
+    ingredients: str,
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = None,
+):
+    """Rank recipes by how many of the comma separated ingredients they use"""
+    terms = [term for term in map(normalize_ingredient, ingredients.split(",")) if term]
+    if not terms:
+        raise HTTPException(status_code=400, detail="No ingredients supplied")
+    ranked = ingredient_index.search(terms, limit)
+    if not ranked:
+        return []
+    
+    projection = requested_fields(fields, Recipe)
+    recipes = await storage.recipes.get_many([recipe_id for recipe_id, _ in ranked], projection)
+    recipes_by_id = {recipe["id"]: parse_from_mongo(recipe) for recipe in recipes}
+    return [
+        {
+            "recipe": recipes_by_id[recipe_id],
+            "matched": matched,
+            "match_count": len(matched),
+            "missing_count": len(ingredient_index.recipe_terms[recipe_id]) - len(matched),
+        }
+        for recipe_id, matched in ranked
+        if recipe_id in recipes_by_id
+    ]
+
+@api_router.get("/recipes/{recipe_id}/similar")
+async def get_similar_recipes(
+    recipe_id: str,
+    k: int = Query(10, ge=1, le=SIMILAR_RECIPES_MAX_K),
+    fields: Optional[str] = None,
+):
+    """The k most similar recipes in the same category, read from the precomputed neighbour index"""
+    # A recipe written by another worker is found once the next sync poll has indexed it
+    if recipe_id not in recipe_matrix.rows:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    if not similarity_index.ready:
+        # Also restarts the first rebuild if it failed
+        similarity_index.schedule_rebuild()
+        raise HTTPException(status_code=503, detail="Similar recipes are still being indexed", headers={"Retry-After": "5"})
+    neighbors = similarity_index.similar(recipe_id, k)
+    projection = requested_fields(fields, Recipe)
+    recipes = await recipe_cache.get_many(neighbor_id for neighbor_id, _ in neighbors)
+    return [
+        {
+            "recipe": parse_from_mongo({
+                field: value for field, value in recipes[neighbor_id].items() if not fields or field in projection
+            }),
+            "score": round(score, 4),
+        }
+        for neighbor_id, score in neighbors
+        if neighbor_id in recipes
+    ]
+
 @api_router.get("/recipes/{recipe_id}", response_model=Recipe)
-async def get_recipe(recipe_id: str):
-    recipe = await db.recipes.find_one({"id": recipe_id})
+async def get_recipe(recipe_id: str, request: Request, response: Response):
+    # The body must be served at the version in its tag: a cached copy from before another worker's update is a miss
+    versions = await storage.versions.get([f"recipe:{recipe_id}"])
+    etag, not_modified = versions_not_modified(request, versions)
+    if not_modified:
+        return not_modified
+    recipe = await recipe_cache.get(recipe_id, version=versions[0])
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    response.headers.update(etag_headers(etag))
     return Recipe(**parse_from_mongo(recipe))
 
 @api_router.put("/recipes/{recipe_id}", response_model=Recipe)
@@ -158,42 +1871,325 @@ async def update_recipe(recipe_id: str, recipe_data: RecipeCreate):
     recipe = Recipe(**recipe_data.dict())
     recipe.id = recipe_id
     recipe_dict = prepare_for_mongo(recipe.dict())
-    await db.recipes.replace_one({"id": recipe_id}, recipe_dict)
+    replaced = await storage.recipes.replace(recipe_dict)
+    await recipe_cache.invalidate(recipe_id)
+    if replaced:
+        await recipe_replaced(recipe_dict)
     return recipe
 
 @api_router.delete("/recipes/{recipe_id}")
 async def delete_recipe(recipe_id: str):
-    result = await db.recipes.delete_one({"id": recipe_id})
-    if result.deleted_count == 0:
+    deleted = await storage.recipes.delete(recipe_id)
+    await recipe_cache.invalidate(recipe_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    await recipe_deleted(recipe_id)
     return {"message": "Recipe deleted successfully"}
 
 # Meal Planning Routes
+async def upsert_meal_plan(date, set_fields, add_snacks=None):
+    """Atomically create or update the single meal plan for a date"""
+    # Slots not being written still need their defaults on a new document
+    defaults = {"breakfast": None, "lunch": None, "dinner": None, "snacks": []}
+    on_insert = {field: value for field, value in defaults.items() if field not in set_fields}
+    if add_snacks:
+        on_insert.pop("snacks", None)
+    on_insert.update(id=str(uuid.uuid4()), created_at=datetime.now(timezone.utc).isoformat())
+    meal_plan = await storage.meal_plans.upsert(date, set_fields, on_insert, add_snacks)
+    await storage.versions.bump(meal_plan_version_keys([date]))
+    return MealPlan(**parse_from_mongo(meal_plan))
+
+async def remove_duplicate_meal_plans():
+    """Keep only the newest plan per date so the unique date index can be built"""
+    removed, dates = await storage.meal_plans.remove_duplicates()
+    if removed:
+        await storage.versions.bump(["meal_plans"])
+        logger.info(f"Removed {removed} duplicate meal plans across {dates} dates")
+
 @api_router.post("/meal-plans", response_model=MealPlan)
 async def create_meal_plan(meal_plan_data: MealPlanCreate):
-    meal_plan = MealPlan(**meal_plan_data.dict())
-    meal_plan_dict = prepare_for_mongo(meal_plan.dict())
-    await db.meal_plans.insert_one(meal_plan_dict)
-    return meal_plan
+    """Save the plan for a date, replacing the slots of any plan already stored for it"""
+    return await upsert_meal_plan(meal_plan_data.date, meal_plan_data.dict(exclude={"date"}))
+
+@api_router.put("/meal-plans/{date}", response_model=MealPlan)
+async def update_meal_plan(date: str, meal_plan_data: MealPlanUpdate):
+    """Partially update (or create) a date's plan: only the slots sent are $set, add_snacks are $pushed"""
+    parse_date_param(date, "meal plan")
+    set_fields = meal_plan_data.dict(exclude_unset=True, exclude={"add_snacks"})
+    if "snacks" in set_fields and meal_plan_data.add_snacks:
+        raise HTTPException(status_code=400, detail="Send either snacks or add_snacks, not both")
+    if set_fields.get("snacks", []) is None:
+        set_fields["snacks"] = []
+    return await upsert_meal_plan(date, set_fields, meal_plan_data.add_snacks)
 
 @api_router.get("/meal-plans", response_model=List[MealPlan])
-async def get_meal_plans():
-    meal_plans = await db.meal_plans.find().sort("date", 1).to_list(50)
+async def get_meal_plans(
+    request: Request,
+    response: Response,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fast: bool = False,
+):
+    """Meal plans in date order, paged through the date index with X-Next-Cursor"""
+    etag, not_modified = await check_not_modified(request, ["meal_plans"])
+    if not_modified:
+        return not_modified
+    start = parse_date_param(from_date, "from").isoformat() if from_date else None
+    end = parse_date_param(to_date, "to").isoformat() if to_date else None
+    after = decode_cursor(cursor) if cursor else None
+    
+    projection = model_fields(MealPlan) if fast else None
+    meal_plans = await storage.meal_plans.list(start, end, after, limit + 1, projection)
+    next_cursor = None
+    if len(meal_plans) > limit:
+        meal_plans = meal_plans[:limit]
+        next_cursor = encode_cursor(meal_plans[-1]["date"])
+    if fast:
+        return fast_list_response(meal_plans, next_cursor, etag)
+    response.headers.update(etag_headers(etag))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [MealPlan(**parse_from_mongo(plan)) for plan in meal_plans]
 
+def expand_meal_plan(plan):
+    """Place the looked-up recipes in their slots and total the day's nutrition"""
+    recipes_by_id = {recipe["id"]: parse_from_mongo(recipe) for recipe in plan.pop("recipes", [])}
+    meal_plan = MealPlan(**parse_from_mongo(plan))
+    slots = {slot: recipes_by_id.get(getattr(meal_plan, slot)) for slot in MEAL_SLOTS}
+    slots["snacks"] = [recipes_by_id[recipe_id] for recipe_id in meal_plan.snacks if recipe_id in recipes_by_id]
+    
+    referenced = [getattr(meal_plan, slot) for slot in MEAL_SLOTS if getattr(meal_plan, slot)] + meal_plan.snacks
+    totals = dict.fromkeys(MACROS, 0.0)
+    for recipe_id in referenced:
+        if recipe_id in recipes_by_id:
+            for macro in MACROS:
+                totals[macro] += recipes_by_id[recipe_id]["nutrition"].get(macro, 0)
+    return {
+        **meal_plan.dict(),
+        "recipes": slots,
+        "totals": {macro: round(value, 2) for macro, value in totals.items()},
+        "missing_recipe_ids": sorted({recipe_id for recipe_id in referenced if recipe_id not in recipes_by_id}),
+    }
+
+@api_router.get("/meal-plans/expanded")
+async def get_meal_plans_expanded(
+    request: Request,
+    response: Response,
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+):
+    """Meal plans in an inclusive date range with their recipes embedded and per-day totals"""
+    start = parse_date_param(from_date, "from")
+    end = parse_date_param(to_date, "to")
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    if (end - start).days >= MAX_MEAL_PLAN_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_MEAL_PLAN_RANGE_DAYS} days")
+    
+    # Embedded recipes make the result depend on both collections
+    etag, not_modified = await check_not_modified(request, ["meal_plans", "recipes"])
+    if not_modified:
+        return not_modified
+    plans = await storage.meal_plans.list_with_recipes(start.isoformat(), end.isoformat())
+    response.headers.update(etag_headers(etag))
+    return [expand_meal_plan(plan) for plan in plans]
+
+@api_router.get("/meal-plans/{date}/expanded")
+async def get_meal_plan_expanded(date: str, request: Request, response: Response):
+    etag, not_modified = await check_not_modified(request, [f"meal_plan:{date}", "recipes"])
+    if not_modified:
+        return not_modified
+    plans = await storage.meal_plans.list_with_recipes(date, date)
+    if not plans:
+        # The placeholder gets a fresh id each time, so it is never tagged
+        return expand_meal_plan(MealPlan(date=date).dict())
+    response.headers.update(etag_headers(etag))
+    return expand_meal_plan(plans[0])
+
 @api_router.get("/meal-plans/{date}", response_model=MealPlan)
-async def get_meal_plan_by_date(date: str):
-    meal_plan = await db.meal_plans.find_one({"date": date})
+async def get_meal_plan_by_date(date: str, request: Request, response: Response):
+    etag, not_modified = await check_not_modified(request, [f"meal_plan:{date}"])
+    if not_modified:
+        return not_modified
+    meal_plan = await storage.meal_plans.get(date)
     if not meal_plan:
-        # Return empty meal plan for the date
+        # Return empty meal plan for the date (untagged, its id is fresh each time)
         return MealPlan(date=date)
+    response.headers.update(etag_headers(etag))
     return MealPlan(**parse_from_mongo(meal_plan))
 
+# Meal plan generation
+DEFAULT_SLOT_CATEGORIES = {
+    "breakfast": ["Breakfast"],
+    "lunch": ["Lunch"],
+    "dinner": ["Dinner"],
+    "snack": ["Snack", "Dessert"],
+}
+MEAL_SLOT_SHARES = {"breakfast": 0.25, "lunch": 0.35, "dinner": 0.4}
+SNACK_SHARE = 0.1
+GENERATOR_SHORTLIST_SIZE = 200
+
+def shortlist_rows(mask, target, weights):
+    """Row indices passing mask, cut to the GENERATOR_SHORTLIST_SIZE closest to target"""
+    rows = np.flatnonzero(mask)
+    if len(rows) > GENERATOR_SHORTLIST_SIZE:
+        scores = (((recipe_matrix.macros[rows] - target) ** 2) * weights).sum(axis=1)
+        rows = rows[np.argpartition(scores, GENERATOR_SHORTLIST_SIZE)[:GENERATOR_SHORTLIST_SIZE]]
+    return rows
+
+def plan_day(slots, candidates, target, weights, beam_width):
+    """Beam search over one day's slots, scoring partial days against the cumulative target share"""
+    macros = recipe_matrix.macros
+    beam_sums = np.zeros((1, len(MACROS)))
+    beam_rows = np.zeros((1, 0), dtype=np.int64)
+    cumulative = 0.0
+    for (_, share), rows in zip(slots, candidates):
+        cumulative += share
+        sums = beam_sums[:, None, :] + macros[rows][None, :, :]
+        scores = (((sums - cumulative * target) ** 2) * weights).sum(axis=2)
+        # The same recipe twice in one day only if nothing else is left
+        repeats = (beam_rows[:, :, None] == rows[None, None, :]).any(axis=1)
+        if not repeats.all():
+            scores[repeats] = np.inf
+        best = np.argsort(scores, axis=None)[:beam_width]
+        beam_index, row_index = np.unravel_index(best, scores.shape)
+        beam_sums = sums[beam_index, row_index]
+        beam_rows = np.column_stack([beam_rows[beam_index], rows[row_index]])
+    return beam_rows[0], beam_sums[0]
+
+def generate_meal_plan_days(request, start):
+    """Choose recipes for each day so daily macros land near the targets; returns (days, warnings)"""
+    target = np.array([getattr(request.targets, macro) or 0.0 for macro in MACROS])
+    # Relative squared error per macro; macros without a target are ignored
+    weights = np.array([1.0 / value ** 2 if value else 0.0 for value in target])
+    slot_categories = {**DEFAULT_SLOT_CATEGORIES, **request.slot_categories}
+    main_share = 1.0 - SNACK_SHARE * request.snacks_per_day
+    slots = [(slot, share * main_share) for slot, share in MEAL_SLOT_SHARES.items()]
+    slots += [("snack", SNACK_SHARE)] * request.snacks_per_day
+    
+    warnings = []
+    slot_masks = {}
+    for slot in {slot for slot, _ in slots}:
+        mask = recipe_matrix.mask(slot_categories.get(slot), request.difficulties)
+        if not mask.any():
+            warnings.append(f"No recipes match the {slot} categories; using any category")
+            mask = recipe_matrix.mask(None, request.difficulties)
+        slot_masks[slot] = mask
+    
+    used = np.zeros(len(recipe_matrix), dtype=bool)
+    days = []
+    for offset in range(request.days):
+        candidates = []
+        for slot, share in slots:
+            mask = slot_masks[slot] & ~used
+            if not mask.any():
+                if not request.allow_repeats:
+                    warnings.append(f"Ran out of unused {slot} recipes on day {offset + 1}; repeating")
+                mask = slot_masks[slot]
+            candidates.append(shortlist_rows(mask, share * target, weights))
+        rows, totals = plan_day(slots, candidates, target, weights, request.beam_width)
+        if not request.allow_repeats:
+            used[rows] = True
+        
+        chosen = [recipe_matrix.ids[row] for row in rows]
+        days.append({
+            "date": (start + timedelta(days=offset)).isoformat(),
+            **dict(zip(MEAL_SLOTS, chosen[:len(MEAL_SLOTS)])),
+            "snacks": chosen[len(MEAL_SLOTS):],
+            "totals": {macro: round(float(value), 2) for macro, value in zip(MACROS, totals)},
+            "deviation": {
+                macro: round(float((value - goal) / goal), 3)
+                for macro, value, goal in zip(MACROS, totals, target) if goal
+            },
+        })
+    return days, warnings
+
+@api_router.post("/meal-plans/generate")
+async def generate_meal_plans(request: GenerateMealPlanRequest):
+    """Generate consecutive days of meal plans close to the macro targets, optionally saving them"""
+    start = parse_date_param(request.start_date, "start")
+    if not len(recipe_matrix):
+        raise HTTPException(status_code=400, detail="No recipes available to plan with")
+    if request.difficulties is not None and not recipe_matrix.mask(None, request.difficulties).any():
+        raise HTTPException(status_code=400, detail="No recipes match the requested difficulties")
+    
+    days, warnings = generate_meal_plan_days(request, start)
+    if request.save:
+        await asyncio.gather(*(
+            upsert_meal_plan(day["date"], {slot: day[slot] for slot in (*MEAL_SLOTS, "snacks")})
+            for day in days
+        ))
+    return {"days": days, "warnings": list(dict.fromkeys(warnings)), "saved": request.save}
+
+# Shopping List Routes
+# recipe id -> (ingredient lines, parsed lines); the lines double as the version check
+parsed_recipe_ingredients = TTLCache(RECIPE_CACHE_SIZE, float("inf"))
+
+def recipe_parsed_ingredients(recipe):
+    cached = parsed_recipe_ingredients.get(recipe["id"])
+    ingredients = tuple(recipe["ingredients"])
+    if cached is None or cached[0] != ingredients:
+        cached = (ingredients, [parse_ingredient(line) for line in ingredients])
+        parsed_recipe_ingredients.set(recipe["id"], cached)
+    return cached[1]
+
+@api_router.get("/shopping-list")
+async def get_shopping_list(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    servings: Optional[float] = Query(None, gt=0),
+):
+    """Summed ingredients for every recipe planned in the range, optionally scaled to a number of servings"""
+    start = parse_date_param(from_date, "from")
+    end = parse_date_param(to_date, "to")
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    if (end - start).days >= MAX_MEAL_PLAN_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_MEAL_PLAN_RANGE_DAYS} days")
+    
+    plans = await storage.meal_plans.list(start.isoformat(), end.isoformat(), fields=(*MEAL_SLOTS, "snacks"))
+    occurrences = Counter()
+    for plan in plans:
+        occurrences.update(plan[slot] for slot in MEAL_SLOTS if plan.get(slot))
+        occurrences.update(plan.get("snacks", []))
+    recipes = await recipe_cache.get_many(occurrences)
+    
+    items = {}
+    for recipe_id, count in occurrences.items():
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        scale = count * (servings / recipe["servings"] if servings and recipe.get("servings") else 1)
+        for parsed in recipe_parsed_ingredients(recipe):
+            if not parsed.item:
+                continue
+            entry = items.setdefault(
+                (parsed.item, parsed.unit),
+                {"item": parsed.name, "quantity": None, "unit": parsed.unit, "recipes": set()},
+            )
+            if parsed.quantity is not None:
+                entry["quantity"] = (entry["quantity"] or 0) + parsed.quantity * scale
+            entry["recipes"].add(recipe["name"])
+    
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "servings": servings,
+        "missing_recipe_ids": sorted(set(occurrences) - set(recipes)),
+        "items": [
+            {**entry, "quantity": round(entry["quantity"], 2) if entry["quantity"] is not None else None,
+             "recipes": sorted(entry["recipes"])}
+            for _, entry in sorted(items.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+        ],
+    }
+
 # Nutrition Tracking Routes
 @api_router.post("/nutrition-logs", response_model=NutritionLog)
 async def create_nutrition_log(log_data: NutritionLogCreate):
     # Get recipe to calculate nutrition
-    recipe = await db.recipes.find_one({"id": log_data.recipe_id})
+    recipe = await recipe_cache.get(log_data.recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     
@@ -211,109 +2207,1048 @@ async def create_nutrition_log(log_data: NutritionLogCreate):
     )
     
     log_dict = prepare_for_mongo(log.dict())
-    await db.nutrition_logs.insert_one(log_dict)
+    failed = await storage.nutrition_logs.insert_many([log_dict])
+    if failed:
+        # Nothing was stored, so the rollup is left alone too
+        logging.error(f"Nutrition log insert failed: {failed[0]}")
+        raise HTTPException(status_code=500, detail="Failed to save nutrition log")
+    await add_to_daily_totals([log])
     return log
 
+@api_router.post("/nutrition-logs/batch")
+async def create_nutrition_logs_batch(logs_data: List[NutritionLogCreate]):
+    """Log many meals at once; unknown recipe ids are reported per item instead of failing the batch"""
+    if len(logs_data) > MAX_NUTRITION_LOG_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_NUTRITION_LOG_BATCH} logs per batch")
+    recipes = await recipe_cache.get_many(log_data.recipe_id for log_data in logs_data)
+    
+    errors = []
+    valid = []
+    valid_indexes = []
+    for index, log_data in enumerate(logs_data):
+        if log_data.recipe_id in recipes:
+            valid.append(log_data)
+            valid_indexes.append(index)
+        else:
+            errors.append({"index": index, "recipe_id": log_data.recipe_id, "detail": "Recipe not found"})
+    if not valid:
+        return {"logs": [], "errors": errors}
+    
+    # Scale every recipe's macros by its servings in one pass
+    servings = np.array([log_data.servings for log_data in valid], dtype=float)
+    per_serving = np.array(
+        [[recipes[log_data.recipe_id]["nutrition"][macro] for macro in MACROS] for log_data in valid],
+        dtype=float,
+    )
+    totals = per_serving * servings[:, None]
+    
+    logs = [
+        NutritionLog(
+            date=log_data.date,
+            meal_type=log_data.meal_type,
+            recipe_id=log_data.recipe_id,
+            servings=log_data.servings,
+            **dict(zip(MACROS, row.tolist()))
+        )
+        for log_data, row in zip(valid, totals)
+    ]
+    failed = await storage.nutrition_logs.insert_many([prepare_for_mongo(log.dict()) for log in logs])
+    for position, message in failed.items():
+        logging.error(f"Nutrition log insert failed: {message}")
+        errors.append({"index": valid_indexes[position], "recipe_id": logs[position].recipe_id, "detail": "Failed to save log"})
+    errors.sort(key=lambda error: error["index"])
+    # Only the stored logs are returned and added to the rollups, so the totals match the logs
+    logs = [log for position, log in enumerate(logs) if position not in failed]
+    await add_to_daily_totals(logs)
+    return {"logs": logs, "errors": errors}
+
 @api_router.get("/nutrition-logs/{date}")
-async def get_nutrition_logs_by_date(date: str):
-    logs = await db.nutrition_logs.find({"date": date}).to_list(50)
-    parsed_logs = [parse_from_mongo(log) for log in logs]
+async def get_nutrition_logs_by_date(date: str, format: str = Query("objects", pattern="^(objects|columns)$")):
+    """A day's logs and totals; format=columns sends the logs as columnar() arrays of their stored values"""
+    logs = await storage.nutrition_logs.list_by_date(date, 50)
     
     # Calculate daily totals
-    total_calories = sum(log["calories"] for log in parsed_logs)
-    total_protein = sum(log["protein"] for log in parsed_logs)
-    total_carbs = sum(log["carbs"] for log in parsed_logs)
-    total_fats = sum(log["fats"] for log in parsed_logs)
+    total_calories = sum(log["calories"] for log in logs)
+    total_protein = sum(log["protein"] for log in logs)
+    total_carbs = sum(log["carbs"] for log in logs)
+    total_fats = sum(log["fats"] for log in logs)
+    totals = {
+        "calories": round(total_calories, 2),
+        "protein": round(total_protein, 2),
+        "carbs": round(total_carbs, 2),
+        "fats": round(total_fats, 2)
+    }
     
+    if format == "columns":
+        return FastJSONResponse({"date": date, "logs": columnar(logs, model_fields(NutritionLog)), "totals": totals})
     return {
         "date": date,
-        "logs": parsed_logs,
-        "totals": {
-            "calories": round(total_calories, 2),
-            "protein": round(total_protein, 2),
-            "carbs": round(total_carbs, 2),
-            "fats": round(total_fats, 2)
-        }
+        "logs": [parse_from_mongo(log) for log in logs],
+        "totals": totals
+    }
+
+async def add_to_daily_totals(logs):
+    """$inc each day's rollup by the logs for that day, one upsert per distinct date"""
+    increments = defaultdict(lambda: dict.fromkeys((*MACROS, "log_count"), 0))
+    for log in logs:
+        day = increments[log.date]
+        for macro in MACROS:
+            day[macro] += getattr(log, macro)
+        day["log_count"] += 1
+    await storage.nutrition_logs.increment_daily_totals(increments)
+
+async def backfill_nutrition_rollups():
+    """Fold logs written before the daily rollups existed into them, once per database.
+
+    The first worker to start records the cutover time; every log written since
+    then was counted by add_to_daily_totals, so only older logs are summed.
+    """
+    name = "nutrition_daily_totals_backfill"
+    migration = await storage.migrations.start(name, datetime.now(timezone.utc).isoformat())
+    if migration["completed"]:
+        return
+    days = await storage.nutrition_logs.backfill_daily_totals(migration["started_at"], MACROS)
+    await storage.migrations.complete(name)
+    if days:
+        logger.info(f"Backfilled nutrition rollups for {days} days of earlier logs")
+
+def summary_period(day, granularity):
+    """Bucket start for a date: the day itself, its ISO week's Monday or the first of its month"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+@api_router.get("/nutrition-summary")
+async def get_nutrition_summary(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+):
+    """Nutrition totals per day, week or month, read from the nutrition_daily_totals rollups"""
+    start = parse_date_param(from_date, "from")
+    end = parse_date_param(to_date, "to")
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    
+    daily = await storage.nutrition_logs.list_daily_totals(start.isoformat(), end.isoformat())
+    
+    buckets = {}
+    for day in daily:
+        period = summary_period(date.fromisoformat(day["date"]), granularity).isoformat()
+        bucket = buckets.setdefault(
+            period, {"period": period, **{macro: 0.0 for macro in MACROS}, "log_count": 0, "days_logged": 0}
+        )
+        for macro in MACROS:
+            bucket[macro] += day.get(macro, 0)
+        bucket["log_count"] += day.get("log_count", 0)
+        bucket["days_logged"] += 1
+    for bucket in buckets.values():
+        for macro in MACROS:
+            bucket[macro] = round(bucket[macro], 2)
+    
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "granularity": granularity,
+        "buckets": list(buckets.values()),
     }
 
 # AI Cooking Assistant Routes
-@api_router.post("/ai-chat")
-async def chat_with_ai(request: ChatRequest):
-    try:
-        # Create LLM chat instance
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=request.session_id,
-            system_message="You are a helpful cooking assistant and nutritionist. Help users with recipes, cooking techniques, nutrition advice, meal planning, and dietary questions. Always provide practical, actionable advice."
-        ).with_model("openai", "gpt-4o-mini")
-        
+COOKING_ASSISTANT_PROMPT = "You are a helpful cooking assistant and nutritionist. Help users with recipes, cooking techniques, nutrition advice, meal planning, and dietary questions. Always provide practical, actionable advice."
+
+def create_cooking_chat(session_id, system_message=COOKING_ASSISTANT_PROMPT):
+    LlmChat, _ = _load_llm()
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=system_message
+    ).with_model("openai", CHAT_MODEL)
+
+class ChatHistoryWriter:
+    """Bounded write-behind queue that batches chat_history inserts off the request path.
+
+    Documents stay in `pending` until their batch is written so reads can merge
+    them in. A full queue applies backpressure for up to put_timeout seconds
+    before the write is dropped and counted.
+    """
+
+    def __init__(self, max_queue, batch_size, flush_interval, put_timeout):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.pending = {}
+        self.counters = Counter()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, document):
+        if self._task is None:
+            # Not running (scripts, tests): write through
+            await storage.chat_history.insert_many([document])
+            self.counters["written"] += 1
+            return
+        self.pending[document["id"]] = document
+        try:
+            await asyncio.wait_for(self.queue.put(document), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(document["id"], None)
+            self.counters["dropped"] += 1
+            logging.error(f"Chat history queue full, dropped message {document['id']}")
+            return
+        self.counters["enqueued"] += 1
+
+    def pending_for(self, session_id):
+        return [dict(document) for document in self.pending.values() if document["session_id"] == session_id]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch):
+        try:
+            for attempt in range(3):
+                try:
+                    failed = await storage.chat_history.insert_many(batch)
+                    self.counters["written"] += len(batch) - len(failed)
+                    self.counters["failed"] += len(failed)
+                    break
+                except Exception as e:
+                    logging.error(f"Chat history batch write failed (attempt {attempt + 1}): {e}")
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+            else:
+                self.counters["dropped"] += len(batch)
+            self.counters["batches"] += 1
+        finally:
+            for document in batch:
+                self.pending.pop(document["id"], None)
+                self.queue.task_done()
+
+    async def close(self, timeout=10):
+        """Flush everything queued, then stop the background task"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Chat history writer shut down with {self.queue.qsize()} unflushed messages")
+        self._task.cancel()
+        self._task = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "pending": len(self.pending),
+            **{counter: self.counters[counter] for counter in ("enqueued", "written", "batches", "failed", "dropped")},
+        }
+
+chat_writer = ChatHistoryWriter(CHAT_WRITER_QUEUE_SIZE, CHAT_WRITER_BATCH_SIZE, CHAT_WRITER_FLUSH_INTERVAL, CHAT_WRITER_PUT_TIMEOUT)
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for budgeting prompts"""
+    return max(1, len(text) // 4)
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight task"""
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield so one caller going away does not cancel the call for the others
+        return await asyncio.shield(task)
+
+class ChatSession:
+    """A live LlmChat plus the bounded window of turns it has been given"""
+
+    def __init__(self, session_id, summary, summarized_through):
+        self.session_id = session_id
+        self.summary = summary
+        self.summarized_through = summarized_through
+        self.turns = deque()
+        self.tokens = 0
+        self.chat = None
+        self.lock = asyncio.Lock()
+
+    def system_message(self):
+        parts = [COOKING_ASSISTANT_PROMPT]
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.turns:
+            parts.append("Recent conversation:\n" + "\n".join(
+                f"User: {turn['message']}\nAssistant: {turn['response']}" for turn in self.turns
+            ))
+        return "\n\n".join(parts)
+
+    def rebuild_chat(self):
+        self.chat = create_cooking_chat(self.session_id, self.system_message())
+
+    def messages(self, message):
+        """The session as chat completion messages: prompt and summary, the window's turns, then message"""
+        system = COOKING_ASSISTANT_PROMPT
+        if self.summary:
+            system += f"\n\nSummary of the earlier conversation:\n{self.summary}"
+        messages = [{"role": "system", "content": system}]
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["message"]})
+            messages.append({"role": "assistant", "content": turn["response"]})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+def summary_line(turn):
+    """A folded turn as one summary line: the question and the start of the answer"""
+    message = " ".join(turn["message"].split())[:160]
+    response = " ".join(turn["response"].split())[:240]
+    return f"- User asked: {message} | Assistant: {response}"
+
+class ChatSessionManager:
+    """LRU of live chat sessions whose prompt is kept within a token budget.
+
+    Turns are appended until the window exceeds token_budget; the oldest turns are
+    then folded into a persisted summary and the LlmChat is rebuilt from summary
+    plus remaining turns, so prompt size stays flat however long the session runs.
+    Evicted sessions are rebuilt the same way from chat_summaries and chat_history.
+    """
+
+    def __init__(self, max_sessions, token_budget, summary_token_budget):
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self._sessions = OrderedDict()
+        self._loads = SingleFlight()
+        self.rebuilds = 0
+        self.compactions = 0
+
+    async def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            # Concurrent first requests share one load, so they get the same ChatSession and lock
+            return await self._loads.do(session_id, lambda: self._load_cached(session_id))
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def _load_cached(self, session_id):
+        session = await self._load(session_id)
+        self._sessions[session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    async def _load(self, session_id):
+        self.rebuilds += 1
+        stored = await storage.chat_history.get_summary(session_id) or {}
+        session = ChatSession(session_id, stored.get("summary", ""), stored.get("summarized_through"))
+        # Newest first (unflushed writes before stored ones), stopping once the window is full
+        recent = []
+        tokens = 0
+        pending = sorted(
+            (turn for turn in chat_writer.pending_for(session_id)
+             if not session.summarized_through or turn["timestamp"] > session.summarized_through),
+            key=lambda turn: turn["timestamp"],
+            reverse=True,
+        )
+        pending_ids = {turn["id"] for turn in pending}
+        async def newest_turns():
+            for turn in pending:
+                yield turn
+            async for turn in storage.chat_history.iter_recent(session_id, session.summarized_through):
+                if turn["id"] not in pending_ids:
+                    yield turn
+        async for turn in newest_turns():
+            tokens += estimate_tokens(turn["message"]) + estimate_tokens(turn["response"])
+            recent.append(turn)
+            if tokens > self.token_budget:
+                break
+        for turn in reversed(recent):
+            self._append(session, turn)
+        await self._compact(session)
+        return session
+
+    def _append(self, session, turn):
+        timestamp = turn["timestamp"]
+        session.turns.append({
+            "message": turn["message"],
+            "response": turn["response"],
+            "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        })
+        session.tokens += estimate_tokens(turn["message"]) + estimate_tokens(turn["response"])
+
+    async def _compact(self, session):
+        """Fold the oldest turns into the summary until the window is back under half the budget"""
+        if session.tokens <= self.token_budget:
+            return False
+        self.compactions += 1
+        lines = session.summary.splitlines() if session.summary else []
+        while session.turns and session.tokens > self.token_budget // 2:
+            turn = session.turns.popleft()
+            session.tokens -= estimate_tokens(turn["message"]) + estimate_tokens(turn["response"])
+            lines.append(summary_line(turn))
+            session.summarized_through = turn["timestamp"]
+        while lines and estimate_tokens("\n".join(lines)) > self.summary_token_budget:
+            lines.pop(0)
+        session.summary = "\n".join(lines)
+        await storage.chat_history.save_summary(
+            {"session_id": session.session_id, "summary": session.summary, "summarized_through": session.summarized_through}
+        )
+        return True
+
+    async def record_turn(self, session, chat_record):
+        """Account for a completed exchange, compacting when over budget"""
+        self._append(session, chat_record.dict())
+        if await self._compact(session):
+            # Rebuilt from the compacted window on next use
+            session.chat = None
+
+    def stats(self):
+        return {
+            "size": len(self._sessions),
+            "max_size": self.max_sessions,
+            "token_budget": self.token_budget,
+            "rebuilds": self.rebuilds,
+            "coalesced_loads": self._loads.coalesced,
+            "compactions": self.compactions,
+        }
+
+chat_sessions = ChatSessionManager(CHAT_SESSION_CACHE_SIZE, CHAT_CONTEXT_TOKEN_BUDGET, CHAT_SUMMARY_TOKEN_BUDGET)
+
+# Caps upstream LLM calls across direct routes and AI job workers
+llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+async def send_llm_message(chat, user_message, purpose):
+    """LlmChat.send_message with its latency and estimated token counts recorded"""
+    async with llm_slots:
+        started = time_module.perf_counter()
+        outcome = "error"
+        try:
+            reply = await chat.send_message(user_message)
+            outcome = "ok"
+            llm_tokens.inc((purpose, "completion"), estimate_tokens(reply))
+            return reply
+        finally:
+            elapsed = time_module.perf_counter() - started
+            llm_call_duration.observe((purpose, outcome), elapsed)
+            llm_tokens.inc((purpose, "prompt"), estimate_tokens(user_message.text))
+            record_breakdown("llm", elapsed)
+
+async def stream_llm_reply(messages, purpose="chat_stream"):
+    """Yield the reply's text deltas as the provider streams them"""
+    client = await streaming_llm_ready()
+    async with llm_slots:
+        started = time_module.perf_counter()
+        outcome = "cancelled"
+        completion_chars = 0
+        try:
+            stream = await client.chat.completions.create(model=CHAT_MODEL, messages=messages, stream=True)
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        completion_chars += len(delta)
+                        yield delta
+            finally:
+                # Stops the upstream generation too when the client has gone away
+                await stream.close()
+            outcome = "ok"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            elapsed = time_module.perf_counter() - started
+            llm_call_duration.observe((purpose, outcome), elapsed)
+            llm_tokens.inc((purpose, "prompt"), sum(estimate_tokens(message["content"]) for message in messages))
+            llm_tokens.inc((purpose, "completion"), completion_chars // 4)
+            record_breakdown("llm", elapsed)
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def run_chat_turn(session_id, message):
+    """Send one message on the session's chat and record the exchange; raises if the LLM call fails"""
+    _, UserMessage = await llm_ready()
+    # Reuse the session's LLM chat instance
+    session = await chat_sessions.get(session_id)
+    
+    async with session.lock:
+        if session.chat is None:
+            session.rebuild_chat()
         # Send message to AI
-        user_message = UserMessage(text=request.message)
-        response = await chat.send_message(user_message)
+        user_message = UserMessage(text=message)
+        response = await send_llm_message(session.chat, user_message, "chat")
         
         # Save chat history
         chat_record = ChatMessage(
-            session_id=request.session_id,
-            message=request.message,
+            session_id=session_id,
+            message=message,
             response=response
         )
-        chat_dict = prepare_for_mongo(chat_record.dict())
-        await db.chat_history.insert_one(chat_dict)
-        
+        await chat_sessions.record_turn(session, chat_record)
+    chat_dict = prepare_for_mongo(chat_record.dict())
+    await chat_writer.enqueue(chat_dict)
+    return response
+
+@api_router.post("/ai-chat")
+async def chat_with_ai(request: ChatRequest, job: bool = False):
+    """Answer a chat message; job=true queues it instead and returns 202 with the job"""
+    if job:
+        return ai_job_accepted(await ai_jobs.submit("chat", request.dict()))
+    try:
+        response = await run_chat_turn(request.session_id, request.message)
         return {"response": response}
         
     except Exception as e:
         logging.error(f"AI chat error: {e}")
         return {"response": "I'm having trouble responding right now. Please try again later."}
 
+@api_router.post("/ai-chat/stream")
+async def chat_with_ai_stream(request: ChatRequest, http_request: Request):
+    """Server-Sent Events variant of /ai-chat: token events, then a done event once the reply is saved"""
+    if not OPENAI_API_KEY:
+        raise HTTPException(status_code=503, detail="Streaming chat requires OPENAI_API_KEY")
+    
+    async def events():
+        chunks = []
+        try:
+            session = await chat_sessions.get(request.session_id)
+            async with session.lock:
+                async with contextlib.aclosing(stream_llm_reply(session.messages(request.message))) as reply:
+                    async for chunk in reply:
+                        if await http_request.is_disconnected():
+                            logging.info(f"AI chat stream for session {request.session_id} closed by client")
+                            return
+                        chunks.append(chunk)
+                        yield sse_event({"token": chunk})
+                chat_record = ChatMessage(
+                    session_id=request.session_id,
+                    message=request.message,
+                    response="".join(chunks)
+                )
+                await chat_sessions.record_turn(session, chat_record)
+                # The session's LlmChat has not seen this exchange
+                session.chat = None
+        except Exception as e:
+            logging.error(f"AI chat stream error: {e}")
+            yield sse_event({"response": "I'm having trouble responding right now. Please try again later."}, event="error")
+            return
+        
+        await chat_writer.enqueue(prepare_for_mongo(chat_record.dict()))
+        yield sse_event({"id": chat_record.id}, event="done")
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @api_router.get("/ai-chat/{session_id}")
-async def get_chat_history(session_id: str):
-    messages = await db.chat_history.find({"session_id": session_id}).sort("timestamp", 1).to_list(50)
-    return [parse_from_mongo(msg) for msg in messages]
+async def get_chat_history(session_id: str, fast: bool = False):
+    projection = model_fields(ChatMessage) if fast else None
+    messages = await storage.chat_history.list_session(session_id, 50, projection)
+    # Include messages still waiting in the write-behind queue
+    stored_ids = {msg["id"] for msg in messages}
+    messages.extend(msg for msg in chat_writer.pending_for(session_id) if msg["id"] not in stored_ids)
+    messages.sort(key=lambda msg: msg["timestamp"])
+    if fast:
+        return fast_list_response(messages[:50])
+    return [parse_from_mongo(msg) for msg in messages[:50]]
 
 # AI Nutrition Analysis
+def canonicalize(value):
+    """Normalize JSON-like input so equivalent payloads hash the same (2000 == 2000.0, key order)"""
+    if isinstance(value, dict):
+        return {str(key): canonicalize(item) for key, item in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 4)
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+def analysis_cache_key(nutrition_data, goals):
+    payload = json.dumps(canonicalize({"nutrition_data": nutrition_data, "goals": goals}), separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+analysis_cache = TTLCache(ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_TTL)
+analysis_flights = SingleFlight()
+analysis_cache_stats = Counter()
+
+async def run_nutrition_analysis(nutrition_data, goals):
+    """Ask the LLM for an analysis; raises on upstream failure"""
+    # Create specialized nutrition analysis prompt
+    prompt = f"""
+    Analyze the following nutrition data and provide insights and recommendations:
+    
+    Daily Totals: {nutrition_data}
+    User Goals: {goals}
+    
+    Please provide:
+    1. Assessment of current nutrition compared to goals
+    2. Specific recommendations for improvement
+    3. Suggested meal adjustments
+    4. Health insights
+    
+    Keep the response practical and actionable.
+    """
+    
+    LlmChat, UserMessage = await llm_ready()
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"nutrition-analysis-{uuid.uuid4()}",
+        system_message="You are a professional nutritionist AI. Provide detailed nutrition analysis and actionable recommendations based on user data."
+    ).with_model("openai", CHAT_MODEL)
+    
+    user_message = UserMessage(text=prompt)
+    return await send_llm_message(chat, user_message, "nutrition_analysis")
+
+async def get_nutrition_analysis(nutrition_data, goals):
+    """Serve an analysis from memory, then Mongo, then one coalesced LLM call; returns (analysis, source)"""
+    key = analysis_cache_key(nutrition_data, goals)
+    analysis = analysis_cache.get(key)
+    if analysis is not None:
+        analysis_cache_stats["memory_hits"] += 1
+        return analysis, "memory"
+    
+    async def load():
+        now = datetime.now(timezone.utc)
+        if db is None:
+            # The embedded storage backend has no persistent second tier
+            analysis_cache_stats["misses"] += 1
+            analysis = await run_nutrition_analysis(nutrition_data, goals)
+            analysis_cache.set(key, analysis)
+            return analysis, "llm"
+        cached = await db.ai_analysis_cache.find_one({"key": key, "expires_at": {"$gt": now}})
+        if cached:
+            analysis_cache_stats["mongo_hits"] += 1
+            analysis_cache.set(key, cached["analysis"])
+            return cached["analysis"], "mongo"
+        analysis_cache_stats["misses"] += 1
+        analysis = await run_nutrition_analysis(nutrition_data, goals)
+        analysis_cache.set(key, analysis)
+        # expires_at stays a native datetime so the TTL index can purge it
+        await db.ai_analysis_cache.replace_one(
+            {"key": key},
+            {"key": key, "analysis": analysis, "created_at": now, "expires_at": now + timedelta(seconds=ANALYSIS_CACHE_TTL)},
+            upsert=True,
+        )
+        return analysis, "llm"
+    
+    return await analysis_flights.do(key, load)
+
 @api_router.post("/ai-nutrition-analysis")
-async def analyze_nutrition(data: Dict[str, Any]):
+async def analyze_nutrition(data: Dict[str, Any], job: bool = False):
+    """Analyze a day's nutrition against goals; job=true queues it instead and returns 202 with the job"""
+    if job:
+        return ai_job_accepted(await ai_jobs.submit("nutrition_analysis", data))
     try:
-        # Create specialized nutrition analysis prompt
         nutrition_data = data.get("nutrition_data", {})
         goals = data.get("goals", {})
-        
-        prompt = f"""
-        Analyze the following nutrition data and provide insights and recommendations:
-        
-        Daily Totals: {nutrition_data}
-        User Goals: {goals}
-        
-        Please provide:
-        1. Assessment of current nutrition compared to goals
-        2. Specific recommendations for improvement
-        3. Suggested meal adjustments
-        4. Health insights
-        
-        Keep the response practical and actionable.
-        """
-        
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"nutrition-analysis-{uuid.uuid4()}",
-            system_message="You are a professional nutritionist AI. Provide detailed nutrition analysis and actionable recommendations based on user data."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        return {"analysis": response}
+        analysis, source = await get_nutrition_analysis(nutrition_data, goals)
+        return {"analysis": analysis, "cached": source != "llm"}
         
     except Exception as e:
         logging.error(f"Nutrition analysis error: {e}")
         return {"analysis": "Unable to analyze nutrition data at the moment. Please try again later."}
 
+# AI Job Queue
+async def run_chat_job(payload):
+    request = ChatRequest(**payload)
+    return {"response": await run_chat_turn(request.session_id, request.message)}
+
+async def run_nutrition_analysis_job(payload):
+    analysis, source = await get_nutrition_analysis(payload.get("nutrition_data", {}), payload.get("goals", {}))
+    return {"analysis": analysis, "cached": source != "llm"}
+
+AI_JOB_HANDLERS = {
+    "chat": run_chat_job,
+    "nutrition_analysis": run_nutrition_analysis_job,
+}
+AI_JOB_TERMINAL_STATUSES = ("completed", "failed")
+
+class AiJobQueue:
+    """Mongo-backed queue of AI jobs drained by a fixed pool of asyncio workers.
+
+    Workers claim the highest-priority due job with find_one_and_update, so
+    several app processes can share the queue. A claim holds a lease; a job
+    whose worker died is claimed again once the lease expires. Failures are
+    retried with exponential backoff until max_attempts is spent.
+    """
+
+    def __init__(self, workers, max_attempts, retry_backoff, lease_seconds, poll_interval, result_ttl):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.counters = Counter()
+        self.running = set()
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._changed = {}  # job id -> Event set the next time this process updates the job
+        self._waiters = Counter()  # job id -> followers waiting on its Event
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def submit(self, kind, payload, priority=0):
+        now = datetime.now(timezone.utc).isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "run_after": now,
+            "lease_expires_at": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+        }
+        require_mongo("AI jobs")
+        await db.ai_jobs.insert_one(dict(job))
+        self.counters["submitted"] += 1
+        self._wakeup.set()
+        return job
+
+    async def claim(self):
+        now = datetime.now(timezone.utc)
+        return await db.ai_jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$lte": now.isoformat()}},
+                {"status": "running", "lease_expires_at": {"$lte": now.isoformat()}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "started_at": now.isoformat(),
+                    "lease_expires_at": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def wait_for_change(self, job_id, timeout):
+        """Return once this process updates the job, or after timeout so other processes' updates are polled"""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] += 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # The last follower out removes the Event, which _notify never pops for jobs run elsewhere
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                if self._changed.get(job_id) is event:
+                    del self._changed[job_id]
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logging.error(f"AI job claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job):
+        self.counters["claimed"] += 1
+        self.running.add(job["id"])
+        self._notify(job["id"])
+        try:
+            if job["attempts"] > job["max_attempts"]:
+                raise RuntimeError("Lease expired on every attempt")
+            result = await AI_JOB_HANDLERS[job["kind"]](job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending the attempt
+            await self._update(job, {"status": "queued", "lease_expires_at": None}, attempts=-1)
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            await self._update(job, {"status": "completed", "result": result, **self._finished()})
+            self.counters["completed"] += 1
+        finally:
+            self.running.discard(job["id"])
+
+    async def _fail(self, job, error):
+        logging.error(f"AI job {job['id']} attempt {job['attempts']} failed: {error}")
+        if job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff * 2 ** (job["attempts"] - 1)
+            run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await self._update(job, {"status": "queued", "run_after": run_after.isoformat(), "lease_expires_at": None, "error": str(error)})
+            asyncio.get_running_loop().call_later(delay, self._wakeup.set)
+            self.counters["retried"] += 1
+        else:
+            await self._update(job, {"status": "failed", "error": str(error), **self._finished()})
+            self.counters["failed"] += 1
+
+    def _finished(self):
+        now = datetime.now(timezone.utc)
+        # expires_at stays a native datetime so the TTL index can purge finished jobs
+        return {"finished_at": now.isoformat(), "lease_expires_at": None, "expires_at": now + timedelta(seconds=self.result_ttl)}
+
+    async def _update(self, job, fields, attempts=0):
+        # Matching on attempts skips the write if the lease expired and another worker took the job
+        update = {"$set": fields}
+        if attempts:
+            update["$inc"] = {"attempts": attempts}
+        await db.ai_jobs.update_one({"id": job["id"], "attempts": job["attempts"]}, update)
+        self._notify(job["id"])
+
+    def _notify(self, job_id):
+        event = self._changed.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def close(self):
+        """Stop the workers; jobs they were running go back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {
+            "workers": len(self._tasks),
+            "running": len(self.running),
+            **self.counters,
+        }
+
+ai_jobs = AiJobQueue(AI_JOB_WORKERS, AI_JOB_MAX_ATTEMPTS, AI_JOB_RETRY_BACKOFF, AI_JOB_LEASE_SECONDS, AI_JOB_POLL_INTERVAL, AI_JOB_RESULT_TTL)
+
+def ai_job_accepted(job):
+    return JSONResponse(
+        {"id": job["id"], "kind": job["kind"], "status": job["status"], "priority": job["priority"], "created_at": job["created_at"]},
+        status_code=202,
+        headers={"Location": f"/api/ai-jobs/{job['id']}"},
+    )
+
+@api_router.post("/ai-jobs", status_code=202)
+async def create_ai_job(job_data: AiJobCreate):
+    """Queue a chat or nutrition analysis call; poll GET /ai-jobs/{id} or follow /ai-jobs/{id}/events for the result"""
+    if job_data.kind == "chat":
+        try:
+            ChatRequest(**job_data.payload)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid chat payload: {describe_validation_error(e)}")
+    return ai_job_accepted(await ai_jobs.submit(job_data.kind, job_data.payload, job_data.priority))
+
+@api_router.get("/ai-jobs/{job_id}")
+async def get_ai_job(job_id: str):
+    require_mongo("AI jobs")
+    job = await db.ai_jobs.find_one({"id": job_id}, {"_id": 0, "expires_at": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/ai-jobs/{job_id}/events")
+async def get_ai_job_events(job_id: str, http_request: Request):
+    """Server-Sent Events with one event per status change, ending with a completed or failed event"""
+    require_mongo("AI jobs")
+    projection = {"_id": 0, "payload": 0, "expires_at": 0}
+    job = await db.ai_jobs.find_one({"id": job_id}, projection)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        nonlocal job
+        last_seen = None
+        while True:
+            if (job["status"], job["attempts"]) != last_seen:
+                last_seen = (job["status"], job["attempts"])
+                yield sse_event(job, event=job["status"])
+            if job["status"] in AI_JOB_TERMINAL_STATUSES or await http_request.is_disconnected():
+                return
+            await ai_jobs.wait_for_change(job_id, AI_JOB_POLL_INTERVAL)
+            job = await db.ai_jobs.find_one({"id": job_id}, projection) or job
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Admin Routes
+@api_router.get("/admin/indexes")
+async def get_index_stats():
+    """Report every index per collection with its $indexStats usage counters"""
+    require_mongo("Index stats")
+    report = {}
+    for collection_name, indexes in INDEX_SPECS.items():
+        declared = {index.document["name"] for index in indexes}
+        stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        report[collection_name] = [
+            {
+                "name": stat["name"],
+                "key": dict(stat["key"]),
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"],
+                "declared": stat["name"] in declared,
+                "missing": False,
+            }
+            for stat in sorted(stats, key=lambda stat: stat["name"])
+        ]
+        report[collection_name].extend(
+            {"name": name, "key": None, "ops": 0, "since": None, "declared": True, "missing": True}
+            for name in sorted(declared - {stat["name"] for stat in stats})
+        )
+    return report
+
+@api_router.get("/admin/cache")
+async def get_cache_stats():
+    return {
+        "recipes": await recipe_cache.stats(),
+        "nutrition_analysis": {
+            "size": len(analysis_cache),
+            "max_size": ANALYSIS_CACHE_SIZE,
+            "ttl_seconds": ANALYSIS_CACHE_TTL,
+            **{counter: analysis_cache_stats[counter] for counter in ("memory_hits", "mongo_hits", "misses")},
+            "coalesced": analysis_flights.coalesced,
+        },
+        "chat_sessions": chat_sessions.stats(),
+        "similar_recipes": {
+            "ready": similarity_index.ready,
+            "indexed": len(similarity_index.neighbors),
+            "writes_since_rebuild": similarity_index.writes_since_rebuild,
+            "last_rebuild_seconds": similarity_index.last_rebuild_seconds,
+        },
+        "recipe_index_sync": recipe_index_sync.stats(),
+    }
+
+# Export Routes
+EXPORT_COLLECTIONS = {
+    "recipes": (Recipe, None),
+    "meal_plans": (MealPlan, "date"),
+    "nutrition_logs": (NutritionLog, "date"),
+    "chat_history": (ChatMessage, "timestamp"),
+}
+
+def csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return "" if value is None else value
+
+async def stream_export(cursor, columns, export_format, batch_size):
+    """Yield the cursor as NDJSON or CSV, one chunk of text per batch_size documents"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(columns)
+    count = 0
+    async for document in cursor:
+        document.pop("_id", None)
+        if export_format == "csv":
+            writer.writerow([csv_value(document.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(document, default=str))
+            buffer.write("\n")
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@api_router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    batch_size: int = Query(500, ge=1, le=10000),
+):
+    """Stream a whole collection, optionally limited to an inclusive date range"""
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {collection}")
+    model, date_field = EXPORT_COLLECTIONS[collection]
+    
+    start = end = None
+    if from_date or to_date:
+        if not date_field:
+            raise HTTPException(status_code=400, detail=f"{collection} cannot be filtered by date")
+        # Compare as ISO strings; the exclusive next-day bound also covers full timestamps
+        if from_date:
+            start = parse_date_param(from_date, "from").isoformat()
+        if to_date:
+            end = (parse_date_param(to_date, "to") + timedelta(days=1)).isoformat()
+    
+    # Each export collection shares its name with the storage repository that iterates it
+    cursor = getattr(storage, collection).iterate(start=start, end=end, batch_size=batch_size)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(cursor, list(model.model_fields), format, batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{collection}.{format}"'},
+    )
+
+@api_router.get("/admin/chat-writer")
+async def get_chat_writer_stats():
+    return chat_writer.stats()
+
+@api_router.get("/admin/ai-jobs")
+async def get_ai_job_stats():
+    require_mongo("AI jobs")
+    counts = await db.ai_jobs.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    return {**ai_jobs.stats(), "jobs": {count["_id"]: count["count"] for count in counts}}
+
+@api_router.get("/admin/startup")
+async def get_startup_profile():
+    """Import and startup phase timings, time to first request, and whether the LLM stack is loaded"""
+    return {
+        **startup_profile.report(),
+        "storage_backend": STORAGE_BACKEND,
+        "llm_loaded": _llm is not None,
+        "llm_warmup": LLM_WARMUP,
+        "loaded_modules": len(sys.modules),
+    }
+
 # Sample data initialization
 @api_router.post("/init-sample-data")
 async def initialize_sample_data():
     # Check if we already have sample recipes
-    existing_count = await db.recipes.count_documents({})
+    existing_count = await storage.recipes.count()
     if existing_count > 0:
         return {"message": "Sample data already exists"}
     
@@ -423,19 +3358,28 @@ async def initialize_sample_data():
         }
     ]
     
-    await db.recipes.insert_many(sample_recipes)
+    await storage.recipes.insert_many(sample_recipes)
+    await recipes_inserted(sample_recipes)
     return {"message": "Sample data initialized successfully"}
 
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, MongoDB command and LLM call metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -444,6 +3388,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup_profile.record("module_import", time_module.perf_counter() - IMPORT_STARTED)
+
+@app.on_event("startup")
+async def startup_db_client():
+    if db is not None:
+        # Once the unique date index has been built there are no duplicates left to remove
+        if "date_unique" not in await db.meal_plans.index_information():
+            with startup_profile.phase("remove_duplicate_meal_plans"):
+                await remove_duplicate_meal_plans()
+        with startup_profile.phase("ensure_indexes"):
+            await ensure_indexes()
+    with startup_profile.phase("nutrition_rollup_backfill"):
+        await backfill_nutrition_rollups()
+    with startup_profile.phase("recipe_indexes"):
+        await load_recipe_indexes()
+    similarity_index.schedule_rebuild()
+    # The embedded store is private to this process, so there is no other worker to follow
+    if storage.name != "memory":
+        recipe_index_sync.start()
+    chat_writer.start()
+    if db is not None:
+        ai_jobs.start()
+    if LLM_WARMUP:
+        await llm_ready()
+    startup_profile.mark_ready()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await ai_jobs.close()
+    await chat_writer.close()
+    await recipe_index_sync.close()
+    if client is not None:
+        client.close()
\ No newline at end of file
@@ -0,0 +1,707 @@
+"""Storage backends for the core collections: recipes, meal plans, nutrition logs and chat history,
+plus the version counters behind conditional GETs and the records of one-time data migrations.
+
+Routes go through these repositories instead of the Motor database so the app
+can also run on the embedded in-memory engine (STORAGE_BACKEND=memory), which
+needs no MongoDB server. Both backends take and return documents in the shape
+they are stored in Mongo: plain dicts with ISO string timestamps and no _id.
+
+Common conventions:
+  fields   an iterable of top-level field names to return, or None for all
+  equals   {field: value} exact matches
+  ranges   {dotted.field: (low, high)} inclusive bounds, either side may be None
+  start/end on iterate(): inclusive/exclusive bounds on the repository's date field
+  insert_many() is unordered and returns {index: error message} for the failures
+"""
+
+import bisect
+import copy
+import uuid
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+MEAL_SLOTS = ("breakfast", "lunch", "dinner")
+
+def get_path(document, path):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+def in_range(value, bounds):
+    low, high = bounds
+    if value is None:
+        return False
+    return (low is None or value >= low) and (high is None or value <= high)
+
+def matches(document, equals=None, ranges=None):
+    if equals and any(document.get(field) != value for field, value in equals.items()):
+        return False
+    if ranges and not all(in_range(get_path(document, field), bounds) for field, bounds in ranges.items()):
+        return False
+    return True
+
+def project(document, fields):
+    if fields is None:
+        return dict(document)
+    return {field: document[field] for field in fields if field in document}
+
+def mongo_projection(fields):
+    if fields is None:
+        return {"_id": 0}
+    return {**{field: 1 for field in fields}, "_id": 0}
+
+def mongo_filter(equals=None, ranges=None):
+    query = dict(equals or {})
+    for field, (low, high) in (ranges or {}).items():
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds["$lte"] = high
+        if bounds:
+            query[field] = bounds
+    return query
+
+def mongo_date_range(field, start=None, end=None):
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return {field: bounds} if bounds else {}
+
+def merge_backfill(row):
+    """Fold a rollup's backfilled totals into its running ones"""
+    for field, amount in row.pop("backfill", {}).items():
+        row[field] = row.get(field, 0) + amount
+    return row
+
+async def insert_many_unordered(collection, documents):
+    if not documents:
+        return {}
+    try:
+        # insert_many adds _id in place, so hand it copies
+        await collection.insert_many([dict(document) for document in documents], ordered=False)
+    except BulkWriteError as e:
+        return {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+    return {}
+
+# MongoDB (Motor) backend
+class MotorRecipeRepository:
+    def __init__(self, db):
+        self.collection = db.recipes
+        self.ingredients = db.recipe_ingredients
+        self.imports = db.recipe_imports
+        self.changes = db.recipe_changes
+
+    async def insert(self, recipe):
+        await self.collection.insert_one(dict(recipe))
+
+    async def insert_many(self, recipes):
+        return await insert_many_unordered(self.collection, recipes)
+
+    async def get(self, recipe_id, fields=None):
+        return await self.collection.find_one({"id": recipe_id}, mongo_projection(fields))
+
+    async def get_many(self, recipe_ids, fields=None):
+        return await self.collection.find({"id": {"$in": list(recipe_ids)}}, mongo_projection(fields)).to_list(None)
+
+    async def list(self, equals=None, ranges=None, after=None, limit=100, fields=None):
+        """Recipes in id order after the given id"""
+        query = mongo_filter(equals, ranges)
+        if after is not None:
+            query["id"] = {"$gt": after}
+        return await self.collection.find(query, mongo_projection(fields)).sort("id", 1).limit(limit).to_list(limit)
+
+    async def replace(self, recipe):
+        result = await self.collection.replace_one({"id": recipe["id"]}, dict(recipe))
+        return result.matched_count > 0
+
+    async def delete(self, recipe_id):
+        result = await self.collection.delete_one({"id": recipe_id})
+        return result.deleted_count > 0
+
+    async def count(self):
+        return await self.collection.count_documents({})
+
+    def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        return self.collection.find({}, mongo_projection(fields)).sort("id", 1).batch_size(batch_size)
+
+    async def load_ingredient_terms(self):
+        """Persisted {recipe_id: (fingerprint, terms)}; the caller checks each fingerprint against its recipe"""
+        return {
+            entry["recipe_id"]: (entry.get("fingerprint"), entry["ingredients"])
+            async for entry in self.ingredients.find({}, {"_id": 0})
+        }
+
+    async def save_ingredient_terms(self, terms_by_recipe, new=False):
+        """Persist {recipe_id: (fingerprint, terms)}; new=True for recipes that were just inserted"""
+        if not terms_by_recipe:
+            return
+        entries = [
+            {"recipe_id": recipe_id, "fingerprint": fingerprint, "ingredients": terms}
+            for recipe_id, (fingerprint, terms) in terms_by_recipe.items()
+        ]
+        if new:
+            await self.ingredients.insert_many(entries, ordered=False)
+            return
+        await self.ingredients.bulk_write(
+            [ReplaceOne({"recipe_id": entry["recipe_id"]}, entry, upsert=True) for entry in entries], ordered=False,
+        )
+
+    async def delete_ingredient_terms(self, recipe_ids):
+        await self.ingredients.delete_many({"recipe_id": {"$in": list(recipe_ids)}})
+
+    async def log_change(self, version, recipe_ids, expires_at):
+        """Record that the write numbered version touched recipe_ids; a TTL index drops it at expires_at"""
+        await self.changes.insert_one({"version": version, "recipe_ids": list(recipe_ids), "expires_at": expires_at})
+
+    async def list_changes(self, after):
+        """Logged changes with version > after, in version order"""
+        return await self.changes.find({"version": {"$gt": after}}, {"_id": 0, "expires_at": 0}).sort("version", 1).to_list(None)
+
+    async def create_import(self, record):
+        await self.imports.insert_one(dict(record))
+
+    async def update_import(self, import_id, fields, errors, max_errors):
+        await self.imports.update_one({"id": import_id}, {
+            "$set": fields,
+            "$push": {"errors": {"$each": errors, "$slice": max_errors}},
+        })
+
+    async def get_import(self, import_id):
+        return await self.imports.find_one({"id": import_id}, {"_id": 0})
+
+class MotorMealPlanRepository:
+    def __init__(self, db):
+        self.collection = db.meal_plans
+
+    async def upsert(self, date, set_fields, on_insert, add_snacks=None):
+        """Atomically create or update the plan for a date and return it"""
+        update = {"$setOnInsert": on_insert}
+        if set_fields:
+            update["$set"] = set_fields
+        if add_snacks:
+            update["$push"] = {"snacks": {"$each": add_snacks}}
+        for attempt in range(2):
+            try:
+                return await self.collection.find_one_and_update(
+                    {"date": date}, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Lost an upsert race on the unique date index; the retry matches the winner's document
+                if attempt:
+                    raise
+
+    async def get(self, date):
+        return await self.collection.find_one({"date": date}, {"_id": 0})
+
+    async def list(self, start=None, end=None, after=None, limit=None, fields=None):
+        """Plans in date order with start <= date <= end and date > after"""
+        bounds = {}
+        if start is not None:
+            bounds["$gte"] = start
+        if end is not None:
+            bounds["$lte"] = end
+        if after is not None:
+            bounds["$gt"] = after
+        cursor = self.collection.find({"date": bounds} if bounds else {}, mongo_projection(fields)).sort("date", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(limit)
+
+    async def list_with_recipes(self, start, end):
+        """Plans in an inclusive date range, each with a recipes list of every recipe it references"""
+        pipeline = [
+            {"$match": {"date": {"$gte": start, "$lte": end}}},
+            {"$sort": {"date": 1}},
+            {"$addFields": {"recipe_ids": {"$setUnion": [
+                {"$filter": {
+                    "input": [f"${slot}" for slot in MEAL_SLOTS],
+                    "as": "recipe_id",
+                    "cond": {"$ne": ["$$recipe_id", None]},
+                }},
+                {"$ifNull": ["$snacks", []]},
+            ]}}},
+            {"$lookup": {"from": "recipes", "localField": "recipe_ids", "foreignField": "id", "as": "recipes"}},
+            {"$project": {"_id": 0, "recipe_ids": 0, "recipes._id": 0}},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(None)
+
+    async def remove_duplicates(self):
+        """Keep only the newest plan per date; returns (plans removed, dates affected)"""
+        duplicates = await self.collection.aggregate([
+            {"$sort": {"created_at": -1}},
+            {"$group": {"_id": "$date", "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ]).to_list(None)
+        stale_ids = [stale_id for group in duplicates for stale_id in group["ids"][1:]]
+        if stale_ids:
+            await self.collection.delete_many({"id": {"$in": stale_ids}})
+        return len(stale_ids), len(duplicates)
+
+    def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        return self.collection.find(mongo_date_range("date", start, end), mongo_projection(fields)).sort("date", 1).batch_size(batch_size)
+
+class MotorNutritionLogRepository:
+    def __init__(self, db):
+        self.collection = db.nutrition_logs
+        self.daily_totals = db.nutrition_daily_totals
+
+    async def insert_many(self, logs):
+        return await insert_many_unordered(self.collection, logs)
+
+    async def list_by_date(self, date, limit=50):
+        return await self.collection.find({"date": date}, {"_id": 0}).limit(limit).to_list(limit)
+
+    async def increment_daily_totals(self, increments):
+        """Add {date: {field: amount}} onto each day's rollup, creating missing days"""
+        if increments:
+            await self.daily_totals.bulk_write(
+                [UpdateOne({"date": day}, {"$inc": totals}, upsert=True) for day, totals in increments.items()],
+                ordered=False,
+            )
+
+    async def list_daily_totals(self, start, end):
+        """Each day's rollup in date order, with any backfilled totals folded in"""
+        query = {"date": {"$gte": start, "$lte": end}}
+        return [merge_backfill(row) for row in await self.daily_totals.find(query, {"_id": 0}).sort("date", 1).to_list(None)]
+
+    async def backfill_daily_totals(self, logged_before, fields):
+        """Sum fields and log_count of the logs logged before logged_before into each day's backfill totals.
+
+        The totals are $set beside the $inc-maintained ones, so running this again is harmless.
+        Returns the number of days backfilled.
+        """
+        daily = await self.collection.aggregate([
+            {"$match": {"logged_at": {"$lt": logged_before}}},
+            {"$group": {
+                "_id": "$date",
+                **{field: {"$sum": f"${field}"} for field in fields},
+                "log_count": {"$sum": 1},
+            }},
+        ]).to_list(None)
+        if daily:
+            await self.daily_totals.bulk_write([
+                UpdateOne({"date": day.pop("_id")}, {"$set": {"backfill": day}}, upsert=True) for day in daily
+            ], ordered=False)
+        return len(daily)
+
+    def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        return self.collection.find(mongo_date_range("date", start, end), mongo_projection(fields)).sort("date", 1).batch_size(batch_size)
+
+class MotorChatHistoryRepository:
+    def __init__(self, db):
+        self.collection = db.chat_history
+        self.summaries = db.chat_summaries
+
+    async def insert_many(self, messages):
+        return await insert_many_unordered(self.collection, messages)
+
+    async def list_session(self, session_id, limit=50, fields=None):
+        """The session's oldest messages in timestamp order"""
+        cursor = self.collection.find({"session_id": session_id}, mongo_projection(fields)).sort("timestamp", 1).limit(limit)
+        return await cursor.to_list(limit)
+
+    def iter_recent(self, session_id, after=None):
+        """The session's messages newest first, optionally only those after a timestamp"""
+        query = {"session_id": session_id}
+        if after:
+            query["timestamp"] = {"$gt": after}
+        return self.collection.find(query, {"_id": 0}).sort("timestamp", -1)
+
+    async def get_summary(self, session_id):
+        return await self.summaries.find_one({"session_id": session_id}, {"_id": 0})
+
+    async def save_summary(self, summary):
+        await self.summaries.replace_one({"session_id": summary["session_id"]}, dict(summary), upsert=True)
+
+    def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        return self.collection.find(mongo_date_range("timestamp", start, end), mongo_projection(fields)).sort("timestamp", 1).batch_size(batch_size)
+
+class MotorVersionRepository:
+    """Write counters per key (a collection or a document), shared by every worker on the database"""
+
+    # Counters live alongside the data they describe, so they survive restarts with it
+    epoch = ""
+
+    def __init__(self, db):
+        self.collection = db.versions
+
+    async def get(self, keys):
+        """Current counter of each key, 0 for keys never bumped"""
+        found = {entry["key"]: entry["version"] async for entry in self.collection.find({"key": {"$in": list(keys)}}, {"_id": 0})}
+        return [found.get(key, 0) for key in keys]
+
+    async def bump(self, keys):
+        if keys:
+            await self.collection.bulk_write(
+                [UpdateOne({"key": key}, {"$inc": {"version": 1}}, upsert=True) for key in dict.fromkeys(keys)],
+                ordered=False,
+            )
+
+    async def increment(self, key):
+        """Bump one counter and return its new value, which no other bump of the key can return"""
+        entry = await self.collection.find_one_and_update(
+            {"key": key}, {"$inc": {"version": 1}},
+            projection={"_id": 0, "version": 1}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        return entry["version"]
+
+class MotorMigrationRepository:
+    """One record per one-time data migration"""
+
+    def __init__(self, db):
+        self.collection = db.migrations
+
+    async def start(self, name, started_at):
+        """The migration's record, created with started_at and completed=False by the first caller"""
+        return await self.collection.find_one_and_update(
+            {"name": name}, {"$setOnInsert": {"started_at": started_at, "completed": False}},
+            projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+
+    async def complete(self, name):
+        await self.collection.update_one({"name": name}, {"$set": {"completed": True}})
+
+# Embedded in-memory backend
+#
+# Documents are deep-copied on write and shallow-copied on read. Each
+# repository keeps its primary sort key in a sorted list so cursors and date
+# ranges are bisected rather than scanned; recipes are also indexed by category.
+
+def sorted_insert(keys, key):
+    index = bisect.bisect_left(keys, key)
+    if index == len(keys) or keys[index] != key:
+        keys.insert(index, key)
+
+def sorted_remove(keys, key):
+    index = bisect.bisect_left(keys, key)
+    if index < len(keys) and keys[index] == key:
+        del keys[index]
+
+def key_range(keys, start=None, end=None, inclusive_end=False):
+    low = bisect.bisect_left(keys, start) if start is not None else 0
+    if end is None:
+        high = len(keys)
+    else:
+        high = bisect.bisect_right(keys, end) if inclusive_end else bisect.bisect_left(keys, end)
+    return keys[low:high]
+
+def duplicate_key(field, value):
+    return DuplicateKeyError(f"E11000 duplicate key error dup key: {{ {field}: \"{value}\" }}", code=11000)
+
+class MemoryRecipeRepository:
+    def __init__(self):
+        self.documents = {}
+        self.ids = []
+        self.ids_by_category = defaultdict(list)
+        self.ingredient_terms = {}
+        self.imports = {}
+        self.changes = deque()
+
+    def _index(self, recipe):
+        sorted_insert(self.ids, recipe["id"])
+        sorted_insert(self.ids_by_category[recipe.get("category")], recipe["id"])
+
+    def _unindex(self, recipe):
+        sorted_remove(self.ids, recipe["id"])
+        sorted_remove(self.ids_by_category[recipe.get("category")], recipe["id"])
+
+    async def insert(self, recipe):
+        if recipe["id"] in self.documents:
+            raise duplicate_key("id", recipe["id"])
+        self.documents[recipe["id"]] = copy.deepcopy(recipe)
+        self._index(recipe)
+
+    async def insert_many(self, recipes):
+        failed = {}
+        for index, recipe in enumerate(recipes):
+            try:
+                await self.insert(recipe)
+            except DuplicateKeyError as e:
+                failed[index] = str(e)
+        return failed
+
+    async def get(self, recipe_id, fields=None):
+        recipe = self.documents.get(recipe_id)
+        return project(recipe, fields) if recipe is not None else None
+
+    async def get_many(self, recipe_ids, fields=None):
+        return [project(self.documents[recipe_id], fields) for recipe_id in dict.fromkeys(recipe_ids) if recipe_id in self.documents]
+
+    async def list(self, equals=None, ranges=None, after=None, limit=100, fields=None):
+        equals = dict(equals or {})
+        ids = self.ids_by_category.get(equals.pop("category"), []) if "category" in equals else self.ids
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        recipes = []
+        for recipe_id in ids[start:]:
+            recipe = self.documents[recipe_id]
+            if matches(recipe, equals, ranges):
+                recipes.append(project(recipe, fields))
+                if len(recipes) == limit:
+                    break
+        return recipes
+
+    async def replace(self, recipe):
+        existing = self.documents.get(recipe["id"])
+        if existing is None:
+            return False
+        self._unindex(existing)
+        self.documents[recipe["id"]] = copy.deepcopy(recipe)
+        self._index(recipe)
+        return True
+
+    async def delete(self, recipe_id):
+        recipe = self.documents.pop(recipe_id, None)
+        if recipe is None:
+            return False
+        self._unindex(recipe)
+        return True
+
+    async def count(self):
+        return len(self.documents)
+
+    async def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        for recipe_id in list(self.ids):
+            recipe = self.documents.get(recipe_id)
+            if recipe is not None:
+                yield project(recipe, fields)
+
+    async def load_ingredient_terms(self):
+        return {recipe_id: (fingerprint, list(terms)) for recipe_id, (fingerprint, terms) in self.ingredient_terms.items()}
+
+    async def save_ingredient_terms(self, terms_by_recipe, new=False):
+        for recipe_id, (fingerprint, terms) in terms_by_recipe.items():
+            self.ingredient_terms[recipe_id] = (fingerprint, list(terms))
+
+    async def delete_ingredient_terms(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            self.ingredient_terms.pop(recipe_id, None)
+
+    async def log_change(self, version, recipe_ids, expires_at):
+        now = datetime.now(timezone.utc)
+        while self.changes and self.changes[0]["expires_at"] <= now:
+            self.changes.popleft()
+        self.changes.append({"version": version, "recipe_ids": list(recipe_ids), "expires_at": expires_at})
+
+    async def list_changes(self, after):
+        now = datetime.now(timezone.utc)
+        return sorted(
+            ({"version": change["version"], "recipe_ids": list(change["recipe_ids"])}
+             for change in self.changes if change["version"] > after and change["expires_at"] > now),
+            key=lambda change: change["version"],
+        )
+
+    async def create_import(self, record):
+        self.imports[record["id"]] = copy.deepcopy(record)
+
+    async def update_import(self, import_id, fields, errors, max_errors):
+        record = self.imports[import_id]
+        record.update(copy.deepcopy(fields))
+        record["errors"] = (record["errors"] + copy.deepcopy(errors))[:max_errors]
+
+    async def get_import(self, import_id):
+        record = self.imports.get(import_id)
+        return copy.deepcopy(record) if record is not None else None
+
+class MemoryMealPlanRepository:
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.documents = {}
+        self.dates = []
+
+    async def upsert(self, date, set_fields, on_insert, add_snacks=None):
+        plan = self.documents.get(date)
+        if plan is None:
+            plan = self.documents[date] = {"date": date, **copy.deepcopy(on_insert)}
+            sorted_insert(self.dates, date)
+        plan.update(copy.deepcopy(set_fields))
+        if add_snacks:
+            plan.setdefault("snacks", []).extend(add_snacks)
+        return dict(plan)
+
+    async def get(self, date):
+        plan = self.documents.get(date)
+        return dict(plan) if plan is not None else None
+
+    async def list(self, start=None, end=None, after=None, limit=None, fields=None):
+        dates = key_range(self.dates, start, end, inclusive_end=True)
+        if after is not None:
+            dates = dates[bisect.bisect_right(dates, after):]
+        if limit:
+            dates = dates[:limit]
+        return [project(self.documents[date], fields) for date in dates]
+
+    async def list_with_recipes(self, start, end):
+        plans = []
+        for date in key_range(self.dates, start, end, inclusive_end=True):
+            plan = dict(self.documents[date])
+            recipe_ids = {plan.get(slot) for slot in MEAL_SLOTS if plan.get(slot)} | set(plan.get("snacks") or [])
+            plan["recipes"] = await self.recipes.get_many(recipe_ids)
+            plans.append(plan)
+        return plans
+
+    async def remove_duplicates(self):
+        # Dates are the primary key here, so there is never more than one plan per date
+        return 0, 0
+
+    async def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        for date in key_range(self.dates, start, end):
+            yield project(self.documents[date], fields)
+
+class MemoryNutritionLogRepository:
+    def __init__(self):
+        self.ids = set()
+        self.logs_by_date = defaultdict(list)
+        self.dates = []
+        self.daily_totals = {}
+
+    async def insert_many(self, logs):
+        failed = {}
+        for index, log in enumerate(logs):
+            if log["id"] in self.ids:
+                failed[index] = str(duplicate_key("id", log["id"]))
+                continue
+            self.ids.add(log["id"])
+            self.logs_by_date[log["date"]].append(copy.deepcopy(log))
+            sorted_insert(self.dates, log["date"])
+        return failed
+
+    async def list_by_date(self, date, limit=50):
+        return [dict(log) for log in self.logs_by_date.get(date, [])[:limit]]
+
+    async def increment_daily_totals(self, increments):
+        for day, totals in increments.items():
+            row = self.daily_totals.setdefault(day, {"date": day})
+            for field, amount in totals.items():
+                row[field] = row.get(field, 0) + amount
+
+    async def list_daily_totals(self, start, end):
+        return [merge_backfill(dict(self.daily_totals[day])) for day in sorted(self.daily_totals) if start <= day <= end]
+
+    async def backfill_daily_totals(self, logged_before, fields):
+        backfilled = 0
+        for day in self.dates:
+            logs = [log for log in self.logs_by_date[day] if log["logged_at"] < logged_before]
+            if logs:
+                row = self.daily_totals.setdefault(day, {"date": day})
+                row["backfill"] = {**{field: sum(log[field] for log in logs) for field in fields}, "log_count": len(logs)}
+                backfilled += 1
+        return backfilled
+
+    async def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        for day in key_range(self.dates, start, end):
+            for log in list(self.logs_by_date[day]):
+                yield project(log, fields)
+
+class MemoryChatHistoryRepository:
+    def __init__(self):
+        self.documents = {}
+        self.keys = []  # (timestamp, id) across every session
+        self.keys_by_session = defaultdict(list)
+        self.summaries = {}
+
+    async def insert_many(self, messages):
+        failed = {}
+        for index, message in enumerate(messages):
+            if message["id"] in self.documents:
+                failed[index] = str(duplicate_key("id", message["id"]))
+                continue
+            self.documents[message["id"]] = copy.deepcopy(message)
+            key = (message["timestamp"], message["id"])
+            sorted_insert(self.keys, key)
+            sorted_insert(self.keys_by_session[message["session_id"]], key)
+        return failed
+
+    async def list_session(self, session_id, limit=50, fields=None):
+        keys = self.keys_by_session.get(session_id, [])
+        return [project(self.documents[message_id], fields) for _, message_id in keys[:limit]]
+
+    async def iter_recent(self, session_id, after=None):
+        for timestamp, message_id in reversed(list(self.keys_by_session.get(session_id, []))):
+            if after and timestamp <= after:
+                return
+            yield dict(self.documents[message_id])
+
+    async def get_summary(self, session_id):
+        summary = self.summaries.get(session_id)
+        return dict(summary) if summary is not None else None
+
+    async def save_summary(self, summary):
+        self.summaries[summary["session_id"]] = dict(summary)
+
+    async def iterate(self, fields=None, start=None, end=None, batch_size=1000):
+        low = bisect.bisect_left(self.keys, (start,)) if start is not None else 0
+        high = bisect.bisect_left(self.keys, (end,)) if end is not None else len(self.keys)
+        for _, message_id in self.keys[low:high]:
+            yield project(self.documents[message_id], fields)
+
+class MemoryVersionRepository:
+    def __init__(self):
+        self.versions = Counter()
+        # Counters restart with the (empty) store, so tags from an earlier process must not match
+        self.epoch = uuid.uuid4().hex[:8]
+
+    async def get(self, keys):
+        return [self.versions[key] for key in keys]
+
+    async def bump(self, keys):
+        for key in dict.fromkeys(keys):
+            self.versions[key] += 1
+
+    async def increment(self, key):
+        self.versions[key] += 1
+        return self.versions[key]
+
+class MemoryMigrationRepository:
+    def __init__(self):
+        self.records = {}
+
+    async def start(self, name, started_at):
+        return dict(self.records.setdefault(name, {"name": name, "started_at": started_at, "completed": False}))
+
+    async def complete(self, name):
+        self.records[name]["completed"] = True
+
+class Storage:
+    """The repositories of one backend"""
+
+    def __init__(self, name, recipes, meal_plans, nutrition_logs, chat_history, versions, migrations):
+        self.name = name
+        self.recipes = recipes
+        self.meal_plans = meal_plans
+        self.nutrition_logs = nutrition_logs
+        self.chat_history = chat_history
+        self.versions = versions
+        self.migrations = migrations
+
+def create_storage(backend, db=None):
+    """Build the repositories for "mongo" (around a Motor database) or "memory" """
+    if backend == "mongo":
+        return Storage(
+            "mongo",
+            MotorRecipeRepository(db),
+            MotorMealPlanRepository(db),
+            MotorNutritionLogRepository(db),
+            MotorChatHistoryRepository(db),
+            MotorVersionRepository(db),
+            MotorMigrationRepository(db),
+        )
+    if backend == "memory":
+        recipes = MemoryRecipeRepository()
+        return Storage(
+            "memory",
+            recipes,
+            MemoryMealPlanRepository(recipes),
+            MemoryNutritionLogRepository(),
+            MemoryChatHistoryRepository(),
+            MemoryVersionRepository(),
+            MemoryMigrationRepository(),
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
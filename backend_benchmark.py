@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""Async load test for the CookAlgo API with per-endpoint latency percentiles.
+
+Runs the FastAPI app in process behind httpx's ASGI transport, so no server
+has to be started:
+
+  * --mongo-url points it at a real MongoDB (a dedicated --db-name that is
+    dropped before and after the run); without it an in-process mongomock-motor
+    stand-in is used, which measures application overhead rather than database
+    latency. --storage memory runs on the embedded backend instead, skipping
+    the endpoints that only exist on MongoDB.
+  * LlmChat is always replaced by a fake with --llm-latency of simulated delay,
+    so the AI routes can be driven without calling the real provider.
+
+A synthetic catalog is seeded, then every endpoint is driven in turn by
+--concurrency async clients for --requests requests. Throughput and
+p50/p95/p99 latency are printed and saved to --output; pass --compare with an
+earlier results file to print p95 and throughput deltas between commits.
+
+Usage: python backend_benchmark.py [--recipes 2000] [--concurrency 16] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+import types
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+
+# Fake LLM
+
+class FakeUserMessage:
+    def __init__(self, text):
+        self.text = text
+
+class FakeLlmChat:
+    """Stand-in for emergentintegrations' LlmChat with a fixed simulated latency"""
+
+    latency = 0.05
+
+    def __init__(self, api_key, session_id, system_message, initial_messages=None):
+        self.session_id = session_id
+        self.system_message = system_message
+        self.turns = 0
+
+    def with_model(self, provider, model):
+        return self
+
+    def reply_to(self, message):
+        self.turns += 1
+        return f"Benchmark reply {self.turns} to: {message.text[:80]}. " + "Keep stirring and season to taste. " * 8
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.latency)
+        return self.reply_to(message)
+
+class FakeCompletionStream:
+    """Stand-in for the OpenAI SDK's AsyncStream of chat completion chunks"""
+
+    def __init__(self, text, latency):
+        self.words = text.split(" ")
+        self.latency = latency
+
+    async def __aiter__(self):
+        for start in range(0, len(self.words), 8):
+            await asyncio.sleep(self.latency / 8)
+            delta = types.SimpleNamespace(content=" ".join(self.words[start:start + 8]) + " ")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+    async def close(self):
+        pass
+
+class FakeOpenAI:
+    """Stand-in for AsyncOpenAI: only the streamed chat.completions.create() call /ai-chat/stream makes"""
+
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=self)
+
+    async def create(self, model, messages, stream):
+        reply = FakeLlmChat(None, None, None).reply_to(FakeUserMessage(messages[-1]["content"]))
+        return FakeCompletionStream(reply, FakeLlmChat.latency)
+
+def install_fake_llm():
+    chat_module = types.ModuleType("emergentintegrations.llm.chat")
+    chat_module.LlmChat = FakeLlmChat
+    chat_module.UserMessage = FakeUserMessage
+    llm_module = types.ModuleType("emergentintegrations.llm")
+    llm_module.chat = chat_module
+    package = types.ModuleType("emergentintegrations")
+    package.llm = llm_module
+    sys.modules.update({
+        "emergentintegrations": package,
+        "emergentintegrations.llm": llm_module,
+        "emergentintegrations.llm.chat": chat_module,
+    })
+
+def load_server(args):
+    """Import backend/server.py against the benchmark database and the fake LLM"""
+    install_fake_llm()
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = args.db_name
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import server
+
+    if args.storage == "memory":
+        backend = "memory"
+    elif args.mongo_url:
+        backend = "mongodb"
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("No --mongo-url given and mongomock-motor is not installed")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+        server.storage = server.create_storage("mongo", server.db)
+        backend = "mongomock-motor"
+    server.OPENAI_API_KEY = "benchmark"
+    server._streaming_llm = FakeOpenAI()
+    return server, backend
+
+# Synthetic catalog
+
+INGREDIENTS = [
+    "chicken breast", "ground beef", "salmon fillet", "tofu", "eggs", "milk", "butter", "olive oil",
+    "garlic", "onion", "red bell pepper", "carrot", "celery", "spinach", "kale", "broccoli",
+    "zucchini", "tomato", "potato", "sweet potato", "black beans", "chickpeas", "lentils", "quinoa",
+    "brown rice", "pasta", "all-purpose flour", "sugar", "honey", "maple syrup", "oats", "almonds",
+    "walnuts", "cheddar cheese", "parmesan", "greek yogurt", "lemon", "lime", "ginger", "cumin",
+    "paprika", "oregano", "basil", "cilantro", "soy sauce", "chicken broth", "coconut milk", "avocado",
+    "mushrooms", "banana", "blueberries", "strawberries", "apple", "cinnamon", "vanilla extract", "salt",
+]
+UNITS = ["cup", "cups", "tbsp", "tsp", "g", "oz", "lb", "ml", ""]
+CATEGORIES = ["Breakfast", "Lunch", "Dinner", "Dessert", "Snack"]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+
+def synthetic_recipe(rng):
+    ingredients = []
+    for name in rng.sample(INGREDIENTS, rng.randint(4, 12)):
+        unit = rng.choice(UNITS)
+        quantity = rng.choice(["1", "2", "1/2", "3", "1 1/2", "200", "4"])
+        ingredients.append(" ".join(part for part in (quantity, unit, name) if part))
+    return {
+        "name": f"{rng.choice(['Roasted', 'Spicy', 'Creamy', 'Quick', 'Classic'])} {rng.choice(INGREDIENTS).title()} {uuid.uuid4().hex[:6]}",
+        "description": "Synthetic benchmark recipe",
+        "ingredients": ingredients,
+        "instructions": [f"Step {step + 1}" for step in range(rng.randint(3, 8))],
+        "prep_time": rng.randint(5, 45),
+        "cook_time": rng.randint(0, 90),
+        "servings": rng.randint(1, 6),
+        "difficulty": rng.choice(DIFFICULTIES),
+        "category": rng.choice(CATEGORIES),
+        "nutrition": {
+            "calories": round(rng.uniform(80, 900), 1),
+            "protein": round(rng.uniform(1, 60), 1),
+            "carbs": round(rng.uniform(1, 110), 1),
+            "fats": round(rng.uniform(1, 45), 1),
+        },
+    }
+
+async def seed(server, client, args, rng):
+    """Insert recipes and meal plans through storage, then log meals and chats through the API"""
+    recipes = [server.prepare_for_mongo(server.Recipe(**synthetic_recipe(rng)).dict()) for _ in range(args.recipes)]
+    for start in range(0, len(recipes), 1000):
+        await server.storage.recipes.insert_many(recipes[start:start + 1000])
+    recipe_ids = [recipe["id"] for recipe in recipes]
+
+    start_date = date.today() - timedelta(days=args.days - 1)
+    dates = [(start_date + timedelta(days=offset)).isoformat() for offset in range(args.days)]
+    for day in dates:
+        await server.upsert_meal_plan(day, {
+            "breakfast": rng.choice(recipe_ids),
+            "lunch": rng.choice(recipe_ids),
+            "dinner": rng.choice(recipe_ids),
+            "snacks": rng.sample(recipe_ids, 2),
+        })
+
+    await server.app.router.startup()
+    rebuild = server.similarity_index._rebuild_task
+    if rebuild is not None:
+        await rebuild
+
+    logs = [
+        {"date": day, "meal_type": rng.choice(MEAL_TYPES), "recipe_id": rng.choice(recipe_ids), "servings": rng.choice([0.5, 1, 1.5, 2])}
+        for day in dates for _ in range(args.logs_per_day)
+    ]
+    for start in range(0, len(logs), server.MAX_NUTRITION_LOG_BATCH):
+        response = await client.post("/api/nutrition-logs/batch", json=logs[start:start + server.MAX_NUTRITION_LOG_BATCH])
+        response.raise_for_status()
+
+    sessions = [f"benchmark-{index}" for index in range(args.chat_sessions)]
+    for session_id in sessions:
+        for turn in range(3):
+            response = await client.post("/api/ai-chat", json={"session_id": session_id, "message": f"Question {turn}"})
+            response.raise_for_status()
+    return {"recipe_ids": recipe_ids, "dates": dates, "sessions": sessions, "created_recipe_ids": []}
+
+# Scenarios
+#
+# Each scenario returns (method, url, request kwargs) for one request; any
+# setup it needs (e.g. creating a recipe to delete) happens before timing.
+
+def scenarios(client, state, rng):
+    recipe_ids, dates, sessions = state["recipe_ids"], state["dates"], state["sessions"]
+
+    def date_range(days=7):
+        first = rng.randrange(max(1, len(dates) - days + 1))
+        return {"from": dates[first], "to": dates[min(first + days - 1, len(dates) - 1)]}
+
+    def ingredient_query():
+        return ",".join(rng.sample(INGREDIENTS, 3))
+
+    async def delete_recipe():
+        response = await client.post("/api/recipes", json=synthetic_recipe(rng))
+        return "DELETE", f"/api/recipes/{response.json()['id']}", {}
+
+    async def import_status():
+        body = "\n".join(json.dumps(synthetic_recipe(rng)) for _ in range(5)).encode()
+        response = await client.post("/api/recipes/import", content=body)
+        return "GET", f"/api/recipes/import/{response.json()['id']}", {}
+
+    async def revalidate(url):
+        etag = (await client.get(url)).headers["ETag"]
+        return "GET", url, {"headers": {"If-None-Match": etag}}
+
+    def import_body(count):
+        return gzip.compress("\n".join(json.dumps(synthetic_recipe(rng)) for _ in range(count)).encode())
+
+    return {
+        "GET /api/recipes": lambda: ("GET", "/api/recipes", {"params": {"limit": 100}}),
+        "GET /api/recipes?fast": lambda: ("GET", "/api/recipes", {"params": {"limit": 100, "fast": "true"}}),
+        "GET /api/recipes?fields": lambda: ("GET", "/api/recipes", {"params": {"limit": 100, "fields": "name,category"}}),
+        "GET /api/recipes?filtered": lambda: ("GET", "/api/recipes", {"params": {
+            "category": rng.choice(CATEGORIES), "max_calories": 500, "max_prep_time": 30, "limit": 50,
+        }}),
+        "GET /api/recipes (304)": lambda: revalidate("/api/recipes?limit=100"),
+        "GET /api/recipes/{id}": lambda: ("GET", f"/api/recipes/{rng.choice(recipe_ids)}", {}),
+        "GET /api/recipes/{id}/similar": lambda: ("GET", f"/api/recipes/{rng.choice(recipe_ids)}/similar", {}),
+        "GET /api/recipes/search/by-ingredients": lambda: ("GET", "/api/recipes/search/by-ingredients", {"params": {"ingredients": ingredient_query()}}),
+        "POST /api/recipes": lambda: ("POST", "/api/recipes", {"json": synthetic_recipe(rng)}),
+        "PUT /api/recipes/{id}": lambda: ("PUT", f"/api/recipes/{rng.choice(recipe_ids)}", {"json": synthetic_recipe(rng)}),
+        "DELETE /api/recipes/{id}": delete_recipe,
+        "POST /api/recipes/import": lambda: ("POST", "/api/recipes/import", {
+            "content": import_body(50), "headers": {"Content-Encoding": "gzip"},
+        }),
+        "GET /api/recipes/import/{id}": import_status,
+        "GET /api/meal-plans": lambda: ("GET", "/api/meal-plans", {"params": {"limit": 50}}),
+        "GET /api/meal-plans?fast": lambda: ("GET", "/api/meal-plans", {"params": {"limit": 50, "fast": "true"}}),
+        "GET /api/meal-plans/expanded": lambda: ("GET", "/api/meal-plans/expanded", {"params": date_range()}),
+        "GET /api/meal-plans/{date}": lambda: ("GET", f"/api/meal-plans/{rng.choice(dates)}", {}),
+        "GET /api/meal-plans/{date}/expanded": lambda: ("GET", f"/api/meal-plans/{rng.choice(dates)}/expanded", {}),
+        "POST /api/meal-plans": lambda: ("POST", "/api/meal-plans", {"json": {
+            "date": rng.choice(dates), "breakfast": rng.choice(recipe_ids), "lunch": rng.choice(recipe_ids), "dinner": rng.choice(recipe_ids),
+        }}),
+        "PUT /api/meal-plans/{date}": lambda: ("PUT", f"/api/meal-plans/{rng.choice(dates)}", {"json": {"add_snacks": [rng.choice(recipe_ids)]}}),
+        "POST /api/meal-plans/generate": lambda: ("POST", "/api/meal-plans/generate", {"json": {
+            "start_date": dates[-1], "days": 7, "targets": {"calories": 2200, "protein": 120}, "snacks_per_day": 1,
+        }}),
+        "GET /api/shopping-list": lambda: ("GET", "/api/shopping-list", {"params": date_range()}),
+        "POST /api/nutrition-logs": lambda: ("POST", "/api/nutrition-logs", {"json": {
+            "date": rng.choice(dates), "meal_type": rng.choice(MEAL_TYPES), "recipe_id": rng.choice(recipe_ids), "servings": 1,
+        }}),
+        "POST /api/nutrition-logs/batch": lambda: ("POST", "/api/nutrition-logs/batch", {"json": [
+            {"date": rng.choice(dates), "meal_type": rng.choice(MEAL_TYPES), "recipe_id": rng.choice(recipe_ids), "servings": 1}
+            for _ in range(50)
+        ]}),
+        "GET /api/nutrition-logs/{date}": lambda: ("GET", f"/api/nutrition-logs/{rng.choice(dates)}", {}),
+        "GET /api/nutrition-summary": lambda: ("GET", "/api/nutrition-summary", {"params": {
+            "from": dates[0], "to": dates[-1], "granularity": rng.choice(["day", "week", "month"]),
+        }}),
+        "POST /api/ai-chat": lambda: ("POST", "/api/ai-chat", {"json": {"session_id": rng.choice(sessions), "message": "How do I sear scallops?"}}),
+        "POST /api/ai-chat/stream": lambda: ("POST", "/api/ai-chat/stream", {"json": {"session_id": rng.choice(sessions), "message": "What can I make with leeks?"}}),
+        "GET /api/ai-chat/{session_id}": lambda: ("GET", f"/api/ai-chat/{rng.choice(sessions)}", {}),
+        "GET /api/ai-chat/{session_id}?fast": lambda: ("GET", f"/api/ai-chat/{rng.choice(sessions)}", {"params": {"fast": "true"}}),
+        "POST /api/ai-nutrition-analysis": lambda: ("POST", "/api/ai-nutrition-analysis", {"json": {
+            # A small key space so the run exercises both cache hits and misses
+            "nutrition_data": {"calories": rng.choice([1800, 2000, 2200, 2400]), "protein": rng.choice([80, 100, 120])},
+            "goals": {"goal": rng.choice(["maintain", "cut", "bulk"])},
+        }}),
+        "POST /api/ai-jobs": lambda: ("POST", "/api/ai-jobs", {"json": {
+            "kind": "chat", "payload": {"session_id": rng.choice(sessions), "message": "Queue this question"}, "priority": rng.randint(0, 5),
+        }}),
+        "GET /api/export/meal_plans": lambda: ("GET", "/api/export/meal_plans", {"params": date_range(30)}),
+        "GET /api/export/nutrition_logs?csv": lambda: ("GET", "/api/export/nutrition_logs", {"params": {**date_range(7), "format": "csv"}}),
+        "GET /api/admin/indexes": lambda: ("GET", "/api/admin/indexes", {}),
+        "GET /api/admin/cache": lambda: ("GET", "/api/admin/cache", {}),
+        "GET /api/admin/chat-writer": lambda: ("GET", "/api/admin/chat-writer", {}),
+        "GET /api/metrics": lambda: ("GET", "/api/metrics", {}),
+        "POST /api/init-sample-data": lambda: ("POST", "/api/init-sample-data", {}),
+    }
+
+# Endpoints that answer 503 on the embedded storage backend
+MONGO_ONLY_SCENARIOS = ("POST /api/ai-jobs", "GET /api/admin/indexes")
+
+# Measurement
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_scenario(client, make_request, total, concurrency, warmup):
+    """Issue total requests from concurrency workers; return latencies in seconds, status counts and wall time"""
+    async def issue():
+        request = make_request()
+        if asyncio.iscoroutine(request):
+            request = await request
+        method, url, kwargs = request
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    for _ in range(warmup):
+        await issue()
+
+    latencies, statuses = [], Counter()
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            elapsed, status = await issue()
+            latencies.append(elapsed)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    return latencies, statuses, time.perf_counter() - started
+
+def summarize(name, latencies, statuses, wall_time):
+    ordered = sorted(latencies)
+    # 304 is the expected answer to a revalidation
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2") and status != "304")
+    milliseconds = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "endpoint": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": dict(statuses),
+        "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else None,
+        "mean_ms": milliseconds(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": milliseconds(percentile(ordered, 0.50)),
+        "p95_ms": milliseconds(percentile(ordered, 0.95)),
+        "p99_ms": milliseconds(percentile(ordered, 0.99)),
+        "max_ms": milliseconds(ordered[-1]) if ordered else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, previous=None):
+    previous_by_endpoint = {result["endpoint"]: result for result in (previous or {}).get("results", [])}
+    header = f"{'endpoint':<42}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    if previous_by_endpoint:
+        header += f"{'p95 Δ':>9}{'rps Δ':>9}"
+    print(header)
+    for result in results:
+        line = (
+            f"{result['endpoint']:<42}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.2f}"
+            f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}"
+        )
+        before = previous_by_endpoint.get(result["endpoint"])
+        if before and before.get("p95_ms") and before.get("throughput_rps"):
+            line += f"{(result['p95_ms'] / before['p95_ms'] - 1) * 100:>+8.0f}%"
+            line += f"{(result['throughput_rps'] / before['throughput_rps'] - 1) * 100:>+8.0f}%"
+        print(line)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCHMARK_MONGO_URL"))
+    parser.add_argument("--db-name", default="cookalgo_benchmark")
+    parser.add_argument("--storage", choices=["mongo", "memory"], default="mongo")
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--logs-per-day", type=int, default=4)
+    parser.add_argument("--chat-sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=50, help="Simulated LLM latency in milliseconds")
+    parser.add_argument("--only", help="Comma separated substrings; run only endpoints whose name contains one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=str(ROOT_DIR / "backend_benchmark_results.json"))
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    parser.add_argument("--keep-db", action="store_true", help="Leave the MongoDB benchmark database in place")
+    args = parser.parse_args()
+
+    FakeLlmChat.latency = args.llm_latency / 1000
+    server, backend = load_server(args)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    if args.mongo_url and args.storage == "mongo":
+        await server.client.drop_database(args.db_name)
+
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        seed_started = time.perf_counter()
+        state = await seed(server, client, args, rng)
+        seed_time = time.perf_counter() - seed_started
+        print(f"Seeded {args.recipes} recipes, {args.days} days of plans and logs into {backend} in {seed_time:.1f}s")
+
+        selected = scenarios(client, state, rng)
+        if args.storage == "memory":
+            selected = {name: make for name, make in selected.items() if name not in MONGO_ONLY_SCENARIOS}
+        if args.only:
+            patterns = [pattern.strip() for pattern in args.only.split(",")]
+            selected = {name: make for name, make in selected.items() if any(pattern in name for pattern in patterns)}
+
+        results = []
+        for name, make_request in selected.items():
+            latencies, statuses, wall_time = await run_scenario(client, make_request, args.requests, args.concurrency, args.warmup)
+            results.append(summarize(name, latencies, statuses, wall_time))
+
+        await server.app.router.shutdown()
+    if args.mongo_url and args.storage == "mongo" and not args.keep_db:
+        # shutdown closed the app's client
+        from motor.motor_asyncio import AsyncIOMotorClient
+        cleanup = AsyncIOMotorClient(args.mongo_url)
+        await cleanup.drop_database(args.db_name)
+        cleanup.close()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    report = {
+        "summary": {
+            "commit": git_commit(),
+            "run_at": datetime.now(timezone.utc).isoformat(),
+            "backend": backend,
+            "recipes": args.recipes,
+            "days": args.days,
+            "logs_per_day": args.logs_per_day,
+            "chat_sessions": args.chat_sessions,
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "llm_latency_ms": args.llm_latency,
+            "seed_seconds": round(seed_time, 3),
+            "endpoints": len(results),
+            "errors": sum(result["errors"] for result in results),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
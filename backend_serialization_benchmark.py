@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Compare the default and fast=true serialization paths of the list endpoints.
+
+Documents are generated in the shape Mongo returns them (ISO string timestamps,
+no _id) and pushed through exactly what each route does after the query:
+
+  default: parse_from_mongo -> model per document -> FastAPI response validation
+           and jsonable_encoder -> JSONResponse
+  fast:    FastJSONResponse straight from the projected documents
+
+A second table compares the object and format=columns layouts of the recipe
+and nutrition log lists on the wire: body size raw, gzip and brotli (as
+CompressionMiddleware would send it), compression time, and the time a client
+spends in json.loads on the uncompressed body.
+
+Usage: python backend_serialization_benchmark.py [--sizes 100,1000,10000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import server
+
+
+def synthetic_recipe(i, now):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Recipe {i}",
+        "description": "A synthetic recipe used for serialization benchmarks",
+        "ingredients": [f"{j + 1} cups ingredient {j}" for j in range(8)],
+        "instructions": [f"Step {j + 1}" for j in range(6)],
+        "prep_time": 10 + i % 30,
+        "cook_time": 15 + i % 45,
+        "servings": 4,
+        "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+        "category": ("Breakfast", "Lunch", "Dinner", "Dessert")[i % 4],
+        "nutrition": {"calories": 350.0 + i % 400, "protein": 20.5, "carbs": 40.0, "fats": 12.25},
+        "created_at": (now - timedelta(seconds=i)).isoformat(),
+    }
+
+
+def synthetic_meal_plan(i, now):
+    return {
+        "id": str(uuid.uuid4()),
+        "date": (now.date() + timedelta(days=i)).isoformat(),
+        "breakfast": str(uuid.uuid4()),
+        "lunch": str(uuid.uuid4()),
+        "dinner": str(uuid.uuid4()),
+        "snacks": [str(uuid.uuid4())],
+        "created_at": (now - timedelta(seconds=i)).isoformat(),
+    }
+
+
+def synthetic_chat_message(i, now):
+    return {
+        "id": str(uuid.uuid4()),
+        "session_id": "benchmark",
+        "message": "How long should I rest a steak?",
+        "response": "Rest it for about half the cooking time, loosely tented with foil. " * 4,
+        "timestamp": (now + timedelta(seconds=i)).isoformat(),
+    }
+
+
+def synthetic_nutrition_log(i, now):
+    return {
+        "id": str(uuid.uuid4()),
+        "date": now.date().isoformat(),
+        "meal_type": ("breakfast", "lunch", "dinner", "snack")[i % 4],
+        "recipe_id": str(uuid.uuid4()),
+        "servings": 1.0 + i % 3 * 0.5,
+        "calories": 350.0 + i % 400,
+        "protein": 20.5,
+        "carbs": 40.0,
+        "fats": 12.25,
+        "logged_at": (now + timedelta(seconds=i)).isoformat(),
+    }
+
+def route_field(path):
+    for route in server.api_router.routes:
+        if route.path == path and "GET" in route.methods:
+            return route.secure_cloned_response_field
+    raise LookupError(path)
+
+
+async def default_path(documents, model, field):
+    content = [model(**server.parse_from_mongo(dict(document))) for document in documents]
+    return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+
+async def fast_path(documents, model, field):
+    return server.fast_list_response(documents).body
+
+
+def median_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+async def print_layouts(sizes, repeat, now):
+    encodings = ["gzip"] + (["br"] if server.brotli is not None else [])
+    print(f"\nlist layouts on the wire, median of {repeat} runs (compression: {', '.join(encodings)})")
+    header = f"{'list':<16}{'docs':>7}{'layout':>9}{'raw bytes':>11}"
+    for encoding in encodings:
+        header += f"{encoding + ' bytes':>12}{encoding + ' ms':>9}"
+    print(header + f"{'parse ms':>10}")
+    cases = [
+        ("recipes", synthetic_recipe, server.Recipe, route_field("/api/recipes")),
+        ("nutrition-logs", synthetic_nutrition_log, server.NutritionLog, None),
+    ]
+    for name, factory, model, field in cases:
+        for size in sizes:
+            documents = [factory(i, now) for i in range(size)]
+            if field is not None:
+                objects = await default_path(documents, model, field)
+            else:
+                objects = server.FastJSONResponse([server.parse_from_mongo(dict(document)) for document in documents]).body
+            columns = server.FastJSONResponse(server.columnar(documents, server.model_fields(model))).body
+            for layout, body in (("objects", objects), ("columns", columns)):
+                line = f"{name:<16}{size:>7}{layout:>9}{len(body):>11}"
+                for encoding in encodings:
+                    elapsed, compressed = median_time(lambda: server.compress_body(body, encoding), repeat)
+                    line += f"{len(compressed):>12}{elapsed * 1000:>9.2f}"
+                parse_time, _ = median_time(lambda: json.loads(body), repeat)
+                print(line + f"{parse_time * 1000:>10.2f}")
+
+async def measure(fn, documents, model, field, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await fn(documents, model, field)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), len(body)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    now = datetime.now(timezone.utc)
+    cases = [
+        ("recipes", synthetic_recipe, server.Recipe, route_field("/api/recipes")),
+        ("meal-plans", synthetic_meal_plan, server.MealPlan, route_field("/api/meal-plans")),
+        ("chat-history", synthetic_chat_message, server.ChatMessage, route_field("/api/ai-chat/{session_id}")),
+    ]
+    encoder = "orjson" if server.orjson is not None else "json"
+    print(f"fast encoder: {encoder}, median of {args.repeat} runs")
+    print(f"{'endpoint':<14}{'docs':>7}{'default ms':>12}{'fast ms':>10}{'speedup':>9}{'bytes':>11}")
+    for name, factory, model, field in cases:
+        for size in sizes:
+            documents = [factory(i, now) for i in range(size)]
+            default_time, default_bytes = await measure(default_path, documents, model, field, args.repeat)
+            fast_time, fast_bytes = await measure(fast_path, documents, model, field, args.repeat)
+            print(
+                f"{name:<14}{size:>7}{default_time * 1000:>12.2f}{fast_time * 1000:>10.2f}"
+                f"{default_time / fast_time:>8.1f}x{fast_bytes:>11}"
+            )
+            if abs(default_bytes - fast_bytes) > default_bytes * 0.1:
+                print(f"  warning: body sizes differ ({default_bytes} vs {fast_bytes} bytes)")
+    await print_layouts(sizes, args.repeat, now)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
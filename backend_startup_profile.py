@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Profile how long a fresh backend worker takes to import, start and serve its first request.
+
+Each profile runs in a fresh interpreter so nothing is already imported:
+
+  * imports: python -X importtime on "import server", summed per top-level
+    package so the heaviest dependencies stand out
+  * crud:    a worker that only serves recipe CRUD; the LLM stack is never loaded
+  * ai:      a worker started with LLM_WARMUP=true, as an AI worker would be
+
+For the crud and ai workers the app's startup event is run and a first
+GET /api/recipes is sent through httpx's ASGI transport, then the
+/api/admin/startup report (phase timings, time to first request, loaded
+module count) and peak RSS are printed side by side.
+
+Without --mongo-url the workers use STORAGE_BACKEND=memory, so no database is
+needed and the numbers isolate the application's own startup cost.
+
+Usage: python backend_startup_profile.py [--mongo-url URL] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+WORKER = """
+import asyncio, json, resource, time
+started = time.perf_counter()
+import server
+import httpx
+
+async def main():
+    await server.app.router.startup()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://profile") as client:
+        (await client.get("/api/recipes", params={"limit": 1})).raise_for_status()
+        report = (await client.get("/api/admin/startup")).json()
+    await server.app.router.shutdown()
+    report["process_to_first_request_seconds"] = round(time.perf_counter() - started, 4)
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(report))
+
+asyncio.run(main())
+"""
+
+def worker_env(args, **overrides):
+    env = dict(os.environ)
+    if args.mongo_url:
+        env.update(STORAGE_BACKEND="mongo", MONGO_URL=args.mongo_url, DB_NAME=args.db_name)
+    else:
+        env["STORAGE_BACKEND"] = "memory"
+    env.update(overrides)
+    return env
+
+def run_python(code, env, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+
+def import_breakdown(args):
+    """Self and cumulative import time per top-level package, in seconds"""
+    result = run_python("import server", worker_env(args), "-X", "importtime")
+    if result.returncode:
+        sys.exit(f"import server failed:\n{result.stderr[-2000:]}")
+    self_time = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        self_time[name.split(".")[0]] += int(own)
+        if name == "server":
+            total = int(cumulative)
+    return total / 1e6, {package: micros / 1e6 for package, micros in self_time.items()}
+
+def worker_profile(args, **overrides):
+    result = run_python(WORKER, worker_env(args, **overrides))
+    if result.returncode:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def print_profiles(profiles):
+    labels = list(profiles)
+    rows = [
+        ("module import (s)", lambda p: p["phases"].get("module_import")),
+        ("  dependency imports (s)", lambda p: p["phases"].get("dependency_imports")),
+        ("  llm import (s)", lambda p: p["phases"].get("llm_import")),
+        ("startup: recipe indexes (s)", lambda p: p["phases"].get("recipe_indexes")),
+        ("startup: ensure indexes (s)", lambda p: p["phases"].get("ensure_indexes")),
+        ("ready after import start (s)", lambda p: p["ready_seconds"]),
+        ("first request served (s)", lambda p: p["first_request_seconds"]),
+        ("process to first request (s)", lambda p: p["process_to_first_request_seconds"]),
+        ("loaded modules", lambda p: p["loaded_modules"]),
+        ("peak RSS (MB)", lambda p: p["max_rss_mb"]),
+    ]
+    print(f"\n{'':<32}" + "".join(f"{label:>14}" for label in labels))
+    for title, value in rows:
+        cells = []
+        for label in labels:
+            profile = profiles[label]
+            cell = None if "error" in profile else value(profile)
+            cells.append("-" if cell is None else str(cell))
+        print(f"{title:<32}" + "".join(f"{cell:>14}" for cell in cells))
+    for label, profile in profiles.items():
+        if "error" in profile:
+            print(f"{label}: {profile['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCHMARK_MONGO_URL"))
+    parser.add_argument("--db-name", default="cookalgo_startup_profile")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list in the import breakdown")
+    args = parser.parse_args()
+
+    total, packages = import_breakdown(args)
+    print(f"import server: {total:.3f}s cumulative; heaviest packages by self time:")
+    for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {package:<32}{seconds * 1000:>9.1f} ms")
+    if "emergentintegrations" in packages:
+        print("  note: emergentintegrations was imported eagerly")
+
+    print_profiles({
+        "crud": worker_profile(args),
+        "ai": worker_profile(args, LLM_WARMUP="true"),
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""Run the storage contract against every backend and compare their startup and query latency.
+
+The same checks are run against each repository implementation in
+backend/storage.py, so a backend only counts as a drop-in replacement when
+every check passes on it:
+
+  * memory: the embedded in-process engine
+  * mongo:  the Motor backend, against --mongo-url (a dedicated --db-name that
+            is dropped before and after) or, without it, mongomock-motor, which
+            does not evaluate every aggregation the real server does
+
+After the contract, each backend is seeded with the same synthetic data and
+timed: startup is creating the storage and loading what the app reads on
+startup (ingredient terms and the recipe matrix columns), then every query is
+repeated --repeat times and its p50/p95 printed side by side.
+
+Usage: python backend_storage_contract.py [--mongo-url URL] [--recipes 5000] [--repeat 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import traceback
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from storage import create_storage
+
+CATEGORIES = ["Breakfast", "Lunch", "Dinner", "Dessert", "Snack"]
+
+def make_recipe(i, **overrides):
+    recipe = {
+        "id": f"recipe-{i:06d}",
+        "name": f"Recipe {i}",
+        "description": "Storage contract recipe",
+        "ingredients": [f"{i % 7 + 1} cups ingredient {i % 13}", "1 tsp salt"],
+        "instructions": ["Mix", "Cook"],
+        "prep_time": 5 + i % 40,
+        "cook_time": i % 90,
+        "servings": 1 + i % 6,
+        "difficulty": ("Easy", "Medium", "Hard")[i % 3],
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "nutrition": {"calories": 100.0 + i % 800, "protein": 10.0, "carbs": 20.0, "fats": 5.0},
+        "image_url": None,
+        "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat(),
+    }
+    recipe.update(overrides)
+    return recipe
+
+def make_log(day, i):
+    return {
+        "id": str(uuid.uuid4()), "date": day, "meal_type": "lunch", "recipe_id": f"recipe-{i:06d}",
+        "servings": 1.0, "calories": 100.0 + i, "protein": 10.0, "carbs": 20.0, "fats": 5.0,
+        "logged_at": f"{day}T12:00:00+00:00",
+    }
+
+def make_message(session_id, i):
+    return {
+        "id": str(uuid.uuid4()), "session_id": session_id, "message": f"Question {i}", "response": f"Answer {i}",
+        "timestamp": (datetime(2024, 3, 1, tzinfo=timezone.utc) + timedelta(minutes=i)).isoformat(),
+    }
+
+async def collect(iterator):
+    return [document async for document in iterator]
+
+# Contract
+
+async def recipes_contract(storage):
+    recipes = storage.recipes
+    assert await recipes.count() == 0
+    await recipes.insert(make_recipe(1))
+    failed = await recipes.insert_many([make_recipe(2), make_recipe(1), make_recipe(3)])
+    assert list(failed) == [1], failed
+    assert await recipes.count() == 3
+
+    recipe = await recipes.get("recipe-000001")
+    assert recipe == make_recipe(1) and "_id" not in recipe
+    assert await recipes.get("missing") is None
+    assert await recipes.get("recipe-000002", ["name"]) == {"name": "Recipe 2"}
+    many = await recipes.get_many(["recipe-000003", "missing", "recipe-000001"], ["id"])
+    assert sorted(recipe["id"] for recipe in many) == ["recipe-000001", "recipe-000003"]
+
+    await recipes.insert_many([make_recipe(i) for i in range(4, 40)])
+    page = await recipes.list(limit=10, fields=["id"])
+    assert [recipe["id"] for recipe in page] == [f"recipe-{i:06d}" for i in range(1, 11)]
+    page = await recipes.list(after="recipe-000010", limit=5, fields=["id"])
+    assert [recipe["id"] for recipe in page] == [f"recipe-{i:06d}" for i in range(11, 16)]
+    expected = [
+        make_recipe(i)["id"] for i in range(1, 40)
+        if i % len(CATEGORIES) == 2 and 10 <= 5 + i % 40 <= 30 and 100 + i % 800 <= 130
+    ]
+    filtered = await recipes.list(
+        {"category": "Dinner"}, {"prep_time": (10, 30), "nutrition.calories": (None, 130)}, limit=100, fields=["id", "category"]
+    )
+    assert [recipe["id"] for recipe in filtered] == expected, filtered
+    assert all(recipe["category"] == "Dinner" for recipe in filtered)
+
+    assert await recipes.replace(make_recipe(2, category="Dessert", name="Renamed"))
+    assert not await recipes.replace(make_recipe(999))
+    assert (await recipes.get("recipe-000002"))["name"] == "Renamed"
+    desserts = await recipes.list({"category": "Dessert"}, limit=100, fields=["id"])
+    assert "recipe-000002" in [recipe["id"] for recipe in desserts]
+    assert await recipes.delete("recipe-000002")
+    assert not await recipes.delete("recipe-000002")
+    assert [recipe["id"] for recipe in await collect(recipes.iterate(["id"]))] == [
+        f"recipe-{i:06d}" for i in range(1, 40) if i != 2
+    ]
+
+    # Writes are copied and reads are at least shallow copies, like the recipe cache's
+    written = make_recipe(50)
+    await recipes.insert(written)
+    written["ingredients"].append("mutated")
+    fetched = await recipes.get("recipe-000050")
+    assert "mutated" not in fetched["ingredients"]
+    fetched["name"] = "mutated"
+    assert (await recipes.get("recipe-000050"))["name"] == "Recipe 50"
+
+async def ingredient_terms_contract(storage):
+    recipes = storage.recipes
+    for i in range(1, 4):
+        await recipes.insert(make_recipe(i))
+    assert await recipes.load_ingredient_terms() == {}
+    await recipes.save_ingredient_terms({"recipe-000001": ("a", ["flour"]), "recipe-000002": ("b", ["egg"])}, new=True)
+    await recipes.save_ingredient_terms({"recipe-000003": ("c", ["milk"]), "recipe-000001": ("d", ["flour", "sugar"])})
+    assert await recipes.load_ingredient_terms() == {
+        "recipe-000001": ("d", ["flour", "sugar"]), "recipe-000002": ("b", ["egg"]), "recipe-000003": ("c", ["milk"]),
+    }
+    await recipes.delete_ingredient_terms(["recipe-000002", "recipe-000003"])
+    assert list(await recipes.load_ingredient_terms()) == ["recipe-000001"]
+    await recipes.save_ingredient_terms({})
+
+async def recipe_changes_contract(storage):
+    recipes = storage.recipes
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    assert await recipes.list_changes(0) == []
+    await recipes.log_change(2, ["recipe-000002"], later)
+    await recipes.log_change(1, ["recipe-000001", "recipe-000003"], later)
+    await recipes.log_change(3, ["recipe-000001"], later)
+    assert await recipes.list_changes(0) == [
+        {"version": 1, "recipe_ids": ["recipe-000001", "recipe-000003"]},
+        {"version": 2, "recipe_ids": ["recipe-000002"]},
+        {"version": 3, "recipe_ids": ["recipe-000001"]},
+    ]
+    assert [change["version"] for change in await recipes.list_changes(2)] == [3]
+
+async def imports_contract(storage):
+    recipes = storage.recipes
+    await recipes.create_import({"id": "import-1", "status": "running", "lines": 0, "errors": []})
+    await recipes.update_import("import-1", {"lines": 3}, [{"line": 1, "error": "bad"}, {"line": 2, "error": "bad"}], 3)
+    await recipes.update_import("import-1", {"lines": 5, "status": "completed"}, [{"line": 4}, {"line": 5}], 3)
+    record = await recipes.get_import("import-1")
+    assert record["status"] == "completed" and record["lines"] == 5
+    assert [error["line"] for error in record["errors"]] == [1, 2, 4]
+    assert await recipes.get_import("missing") is None
+
+async def meal_plans_contract(storage):
+    meal_plans = storage.meal_plans
+    defaults = {"breakfast": None, "lunch": None, "dinner": None, "snacks": []}
+
+    plan = await meal_plans.upsert("2024-05-02", {"breakfast": "recipe-000001"}, {
+        "lunch": None, "dinner": None, "snacks": [], "id": "plan-2", "created_at": "2024-05-01T00:00:00+00:00",
+    })
+    assert plan["breakfast"] == "recipe-000001" and plan["id"] == "plan-2" and "_id" not in plan
+    plan = await meal_plans.upsert("2024-05-02", {"dinner": "recipe-000002"}, {"id": "ignored"}, ["recipe-000003"])
+    assert plan["id"] == "plan-2" and plan["breakfast"] == "recipe-000001" and plan["dinner"] == "recipe-000002"
+    assert plan["snacks"] == ["recipe-000003"]
+    plan = await meal_plans.upsert("2024-05-01", {}, {**defaults, "id": "plan-1"}, ["recipe-000004"])
+    assert plan["snacks"] == ["recipe-000004"]
+    await meal_plans.upsert("2024-05-03", {"lunch": "missing-recipe"}, {"breakfast": None, "dinner": None, "snacks": [], "id": "plan-3"})
+    await meal_plans.upsert("2024-06-01", {}, {**defaults, "id": "plan-4"})
+
+    assert (await meal_plans.get("2024-05-02"))["dinner"] == "recipe-000002"
+    assert await meal_plans.get("2024-01-01") is None
+    listed = await meal_plans.list("2024-05-01", "2024-05-03")
+    assert [plan["date"] for plan in listed] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    listed = await meal_plans.list(after="2024-05-01", limit=2, fields=["date", "snacks"])
+    assert listed == [{"date": "2024-05-02", "snacks": ["recipe-000003"]}, {"date": "2024-05-03", "snacks": []}]
+    iterated = await collect(meal_plans.iterate(["date"], start="2024-05-02", end="2024-06-01"))
+    assert iterated == [{"date": "2024-05-02"}, {"date": "2024-05-03"}]
+    assert await meal_plans.remove_duplicates() == (0, 0)
+
+async def meal_plan_recipes_contract(storage):
+    await storage.recipes.insert_many([make_recipe(i) for i in range(1, 6)])
+    meal_plans = storage.meal_plans
+    await meal_plans.upsert("2024-05-01", {"breakfast": "recipe-000004"}, {"lunch": None, "dinner": None, "snacks": [], "id": "plan-1"})
+    await meal_plans.upsert("2024-05-02", {
+        "breakfast": "recipe-000001", "lunch": None, "dinner": "recipe-000002", "snacks": ["recipe-000003", "recipe-000001"],
+    }, {"id": "plan-2"})
+    await meal_plans.upsert("2024-05-03", {"lunch": "missing-recipe"}, {"breakfast": None, "dinner": None, "snacks": [], "id": "plan-3"})
+
+    expanded = await meal_plans.list_with_recipes("2024-05-02", "2024-05-03")
+    assert [plan["date"] for plan in expanded] == ["2024-05-02", "2024-05-03"]
+    assert sorted(recipe["id"] for recipe in expanded[0]["recipes"]) == ["recipe-000001", "recipe-000002", "recipe-000003"]
+    assert "_id" not in expanded[0] and all("_id" not in recipe for recipe in expanded[0]["recipes"])
+    assert expanded[1]["recipes"] == []
+
+async def nutrition_logs_contract(storage):
+    nutrition_logs = storage.nutrition_logs
+    logs = [make_log("2024-05-01", i) for i in range(3)] + [make_log("2024-05-02", 10), make_log("2024-05-04", 20)]
+    assert await nutrition_logs.insert_many(logs) == {}
+    assert list(await nutrition_logs.insert_many([logs[0], make_log("2024-05-01", 5)])) == [0]
+
+    by_date = await nutrition_logs.list_by_date("2024-05-01")
+    assert len(by_date) == 4 and all("_id" not in log for log in by_date)
+    assert len(await nutrition_logs.list_by_date("2024-05-01", limit=2)) == 2
+
+    assert await nutrition_logs.list_daily_totals("2024-05-01", "2024-05-31") == []
+    await nutrition_logs.increment_daily_totals({"2024-05-01": {"calories": 100.0, "log_count": 1}})
+    await nutrition_logs.increment_daily_totals({
+        "2024-05-01": {"calories": 50.0, "log_count": 1}, "2024-05-04": {"calories": 10.0, "log_count": 1},
+    })
+    await nutrition_logs.increment_daily_totals({})
+    assert await nutrition_logs.list_daily_totals("2024-05-01", "2024-05-03") == [
+        {"date": "2024-05-01", "calories": 150.0, "log_count": 2},
+    ]
+    # Backfilled totals add to the running ones, and backfilling again does not double them
+    for _ in range(2):
+        assert await nutrition_logs.backfill_daily_totals("2024-05-02T12:00:00+00:00", ["calories", "protein"]) == 1
+    assert await nutrition_logs.list_daily_totals("2024-05-01", "2024-05-03") == [
+        {"date": "2024-05-01", "calories": 150.0 + 100 + 101 + 102 + 105, "protein": 40.0, "log_count": 6},
+    ]
+
+    iterated = await collect(nutrition_logs.iterate(["date"], start="2024-05-02", end="2024-05-05"))
+    assert iterated == [{"date": "2024-05-02"}, {"date": "2024-05-04"}]
+
+async def chat_history_contract(storage):
+    chat_history = storage.chat_history
+    messages = [make_message("session-a", i) for i in range(5)] + [make_message("session-b", 100)]
+    # Out of timestamp order on purpose
+    assert await chat_history.insert_many(messages[3:] + messages[:3]) == {}
+    assert list(await chat_history.insert_many([messages[0]])) == [0]
+
+    history = await chat_history.list_session("session-a", 3, ["message"])
+    assert history == [{"message": "Question 0"}, {"message": "Question 1"}, {"message": "Question 2"}]
+    assert await chat_history.list_session("missing") == []
+    recent = await collect(chat_history.iter_recent("session-a", after=messages[2]["timestamp"]))
+    assert [message["message"] for message in recent] == ["Question 4", "Question 3"]
+    assert "_id" not in recent[0]
+    assert len(await collect(chat_history.iter_recent("session-a"))) == 5
+
+    assert await chat_history.get_summary("session-a") is None
+    await chat_history.save_summary({"session_id": "session-a", "summary": "one", "summarized_through": None})
+    await chat_history.save_summary({"session_id": "session-a", "summary": "two", "summarized_through": messages[1]["timestamp"]})
+    assert await chat_history.get_summary("session-a") == {
+        "session_id": "session-a", "summary": "two", "summarized_through": messages[1]["timestamp"],
+    }
+
+    iterated = await collect(chat_history.iterate(["id"], start="2024-03-01", end=messages[3]["timestamp"]))
+    assert [message["id"] for message in iterated] == [message["id"] for message in messages[:3]]
+
+async def versions_contract(storage):
+    versions = storage.versions
+    assert await versions.get(["recipes", "recipe:1"]) == [0, 0]
+    await versions.bump(["recipes", "recipe:1"])
+    await versions.bump(["recipes", "recipe:2", "recipe:2"])
+    await versions.bump([])
+    assert await versions.get(["recipe:2", "recipes", "recipe:1", "meal_plans"]) == [1, 2, 1, 0]
+    assert await versions.increment("recipes") == 3
+    assert await versions.increment("meal_plans") == 1
+
+async def migrations_contract(storage):
+    migrations = storage.migrations
+    assert await migrations.start("backfill", "2024-05-01") == {"name": "backfill", "started_at": "2024-05-01", "completed": False}
+    assert (await migrations.start("backfill", "2024-06-01"))["started_at"] == "2024-05-01"
+    await migrations.complete("backfill")
+    assert (await migrations.start("backfill", "2024-06-01"))["completed"] is True
+
+CONTRACT = [
+    recipes_contract,
+    ingredient_terms_contract,
+    recipe_changes_contract,
+    imports_contract,
+    meal_plans_contract,
+    meal_plan_recipes_contract,
+    nutrition_logs_contract,
+    chat_history_contract,
+    versions_contract,
+    migrations_contract,
+]
+
+# Backends
+
+class MongoTarget:
+    """Fresh databases on a real MongoDB or mongomock-motor, dropped after each use"""
+
+    def __init__(self, mongo_url, db_name):
+        if mongo_url:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self.client = AsyncIOMotorClient(mongo_url)
+            self.label = "mongo"
+            self.unsupported = set()
+        else:
+            from mongomock_motor import AsyncMongoMockClient
+            self.client = AsyncMongoMockClient()
+            self.label = "mongo (mongomock)"
+            # mongomock does not evaluate field paths inside the pipeline's array literal
+            self.unsupported = {"meal_plan_recipes_contract", "meal_plans.list_with_recipes"}
+        self.db_name = db_name
+
+    async def create(self):
+        await self.client.drop_database(self.db_name)
+        db = self.client[self.db_name]
+        # The uniqueness the contract relies on comes from the app's indexes
+        await db.recipes.create_index("id", unique=True)
+        await db.meal_plans.create_index("date", unique=True)
+        await db.nutrition_logs.create_index("id", unique=True)
+        await db.chat_history.create_index("id", unique=True)
+        await db.recipe_ingredients.create_index("recipe_id", unique=True)
+        await db.recipe_changes.create_index("version", unique=True)
+        await db.versions.create_index("key", unique=True)
+        await db.migrations.create_index("name", unique=True)
+        return create_storage("mongo", db)
+
+    async def drop(self):
+        await self.client.drop_database(self.db_name)
+
+class MemoryTarget:
+    label = "memory"
+    unsupported = set()
+
+    async def create(self):
+        return create_storage("memory")
+
+    async def drop(self):
+        pass
+
+async def run_contract(target):
+    failures = 0
+    for check in CONTRACT:
+        if check.__name__ in target.unsupported:
+            print(f"  skip  {check.__name__} (needs a real MongoDB server)")
+            continue
+        storage = await target.create()
+        try:
+            await check(storage)
+            print(f"  ok    {check.__name__}")
+        except Exception:
+            failures += 1
+            print(f"  FAIL  {check.__name__}")
+            print("        " + traceback.format_exc().strip().replace("\n", "\n        "))
+        finally:
+            await target.drop()
+    return failures
+
+# Comparison
+
+async def seed(storage, args, rng):
+    recipes = [make_recipe(i) for i in range(args.recipes)]
+    for start in range(0, len(recipes), 1000):
+        await storage.recipes.insert_many(recipes[start:start + 1000])
+    await storage.recipes.save_ingredient_terms(
+        {recipe["id"]: sorted(recipe["ingredients"]) for recipe in recipes}, new=True
+    )
+    first_day = date(2024, 1, 1)
+    days = [(first_day + timedelta(days=offset)).isoformat() for offset in range(args.days)]
+    for day in days:
+        await storage.meal_plans.upsert(day, {
+            "breakfast": rng.choice(recipes)["id"], "lunch": rng.choice(recipes)["id"],
+            "dinner": rng.choice(recipes)["id"], "snacks": [rng.choice(recipes)["id"]],
+        }, {"id": str(uuid.uuid4()), "created_at": f"{day}T00:00:00+00:00"})
+    logs = [make_log(day, i) for day in days for i in range(args.logs_per_day)]
+    await storage.nutrition_logs.insert_many(logs)
+    totals = {day: {"calories": 0.0, "log_count": 0} for day in days}
+    for log in logs:
+        totals[log["date"]]["calories"] += log["calories"]
+        totals[log["date"]]["log_count"] += 1
+    await storage.nutrition_logs.increment_daily_totals(totals)
+    sessions = [f"session-{index}" for index in range(args.chat_sessions)]
+    for session_id in sessions:
+        await storage.chat_history.insert_many([make_message(session_id, i) for i in range(args.messages_per_session)])
+    return [recipe["id"] for recipe in recipes], days, sessions
+
+async def startup(storage):
+    """What the app reads from storage before it serves its first request"""
+    terms = await storage.recipes.load_ingredient_terms()
+    columns = await collect(storage.recipes.iterate(["id", "ingredients", "nutrition", "category", "difficulty"]))
+    return terms, columns
+
+def queries(storage, recipe_ids, days, sessions, rng):
+    def week():
+        first = rng.randrange(max(1, len(days) - 6))
+        return days[first], days[min(first + 6, len(days) - 1)]
+
+    return {
+        "recipes.get": lambda: storage.recipes.get(rng.choice(recipe_ids)),
+        "recipes.get_many(20)": lambda: storage.recipes.get_many(rng.sample(recipe_ids, 20)),
+        "recipes.list(page)": lambda: storage.recipes.list(after=rng.choice(recipe_ids), limit=100),
+        "recipes.list(filtered)": lambda: storage.recipes.list(
+            {"category": rng.choice(CATEGORIES)}, {"prep_time": (None, 30), "nutrition.calories": (None, 500)}, limit=50,
+        ),
+        "meal_plans.get": lambda: storage.meal_plans.get(rng.choice(days)),
+        "meal_plans.list(week)": lambda: storage.meal_plans.list(*week()),
+        "meal_plans.list_with_recipes": lambda: storage.meal_plans.list_with_recipes(*week()),
+        "nutrition_logs.list_by_date": lambda: storage.nutrition_logs.list_by_date(rng.choice(days)),
+        "nutrition_logs.list_daily_totals": lambda: storage.nutrition_logs.list_daily_totals(*week()),
+        "chat_history.list_session": lambda: storage.chat_history.list_session(rng.choice(sessions)),
+    }
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def measure(target, args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    storage = await target.create()
+    created = time.perf_counter() - started
+    recipe_ids, days, sessions = await seed(storage, args, rng)
+    started = time.perf_counter()
+    await startup(storage)
+    loaded = time.perf_counter() - started
+
+    latencies = {}
+    failed = []
+    for name, query in queries(storage, recipe_ids, days, sessions, rng).items():
+        if name in target.unsupported:
+            continue
+        timings = []
+        try:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                await query()
+                timings.append(time.perf_counter() - started)
+        except Exception as e:
+            failed.append(f"{name}: {type(e).__name__}: {e}")
+            continue
+        timings.sort()
+        latencies[name] = (percentile(timings, 0.5), percentile(timings, 0.95))
+    await target.drop()
+    return {"create": created, "startup": loaded, "latencies": latencies, "failed": failed}
+
+def print_comparison(results):
+    labels = list(results)
+    print(f"\n{'':<34}" + "".join(f"{label:>24}" for label in labels))
+    for key, title in (("create", "create storage (ms)"), ("startup", "startup reads (ms)")):
+        print(f"{title:<34}" + "".join(f"{results[label][key] * 1000:>24.1f}" for label in labels))
+    print(f"{'query p50 / p95 (ms)':<34}")
+    names = dict.fromkeys(name for result in results.values() for name in result["latencies"])
+    for name in names:
+        cells = []
+        for label in labels:
+            latency = results[label]["latencies"].get(name)
+            cells.append(f"{latency[0] * 1000:.3f} / {latency[1] * 1000:.3f}" if latency else "n/a")
+        print(f"  {name:<32}" + "".join(f"{cell:>24}" for cell in cells))
+    for label in labels:
+        for failure in results[label]["failed"]:
+            print(f"{label}: query failed: {failure}")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCHMARK_MONGO_URL"))
+    parser.add_argument("--db-name", default="cookalgo_storage_contract")
+    parser.add_argument("--backends", default="memory,mongo", help="Comma separated subset of memory,mongo")
+    parser.add_argument("--contract-only", action="store_true")
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--logs-per-day", type=int, default=4)
+    parser.add_argument("--chat-sessions", type=int, default=20)
+    parser.add_argument("--messages-per-session", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    targets = []
+    for backend in args.backends.split(","):
+        if backend == "memory":
+            targets.append(MemoryTarget())
+        elif backend == "mongo":
+            try:
+                targets.append(MongoTarget(args.mongo_url, args.db_name))
+            except ImportError:
+                print("Skipping mongo: no --mongo-url given and mongomock-motor is not installed")
+        else:
+            sys.exit(f"Unknown backend: {backend}")
+
+    failures = 0
+    for target in targets:
+        print(f"Contract: {target.label}")
+        failures += await run_contract(target)
+
+    if not args.contract_only:
+        results = {}
+        for target in targets:
+            results[target.label] = await measure(target, args)
+        print_comparison(results)
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    asyncio.run(main())
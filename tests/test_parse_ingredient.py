@@ -0,0 +1,69 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+from server import ParsedIngredient, parse_ingredient  # noqa: E402
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("3 eggs", ParsedIngredient(3.0, None, "egg", "eggs")),
+    ("0.5 kg potatoes", ParsedIngredient(500.0, "g", "potato", "potatoes")),
+    ("salt to taste", ParsedIngredient(None, None, "salt", "salt")),
+    ("1 (14 oz) can tomatoes", ParsedIngredient(1.0, "can", "tomato", "tomatoes")),
+])
+def test_plain_lines(text, expected):
+    assert parse_ingredient(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # The upper bound is bought
+    ("2-3 cloves garlic", ParsedIngredient(3.0, "clove", "garlic", "garlic")),
+    ("1-2 cups water", ParsedIngredient(480.0, "ml", "water", "water")),
+    ("2 to 3 tablespoons olive oil", ParsedIngredient(45.0, "ml", "olive oil", "olive oil")),
+])
+def test_ranges(text, expected):
+    assert parse_ingredient(text) == expected
+
+
+@pytest.mark.parametrize("text, quantity", [
+    ("½ cup milk", 120.0),
+    ("1½ cups milk", 360.0),
+    ("1 1/2 cups milk", 360.0),
+    ("⅓ cup milk", 80.0),
+    ("¾ cup milk", 180.0),
+])
+def test_fractions(text, quantity):
+    parsed = parse_ingredient(text)
+    assert parsed.quantity == pytest.approx(quantity)
+    assert (parsed.unit, parsed.item) == ("ml", "milk")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a pinch of salt", ParsedIngredient(1.0, "pinch", "salt", "salt")),
+    ("an onion", ParsedIngredient(1.0, None, "onion", "onion")),
+])
+def test_articles_count_as_one(text, expected):
+    assert parse_ingredient(text) == expected
+
+
+@pytest.mark.parametrize("text, quantity, unit", [
+    ("2 tbsp butter", 30.0, "ml"),
+    ("1 teaspoon butter", 5.0, "ml"),
+    ("1.5 l butter", 1500.0, "ml"),
+    ("2 lbs butter", 907.18, "g"),
+    ("4 oz butter", 113.4, "g"),
+])
+def test_unit_conversion(text, quantity, unit):
+    parsed = parse_ingredient(text)
+    assert parsed.quantity == pytest.approx(quantity)
+    assert parsed.unit == unit
+
+
+@pytest.mark.parametrize("text", ["1/0 cup water", "1 0/0 cup water", "2-1/0 cups water"])
+def test_zero_denominator_leaves_no_quantity(text):
+    assert parse_ingredient(text) == ParsedIngredient(None, None, "water", "water")
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import server  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+def make_recipe(i, ingredients):
+    return {
+        "id": f"recipe-{i}",
+        "name": f"Recipe {i}",
+        "category": "Dinner",
+        "difficulty": "Easy",
+        "ingredients": ingredients,
+        "nutrition": {"calories": 300.0 + i, "protein": 20.0, "carbs": 40.0, "fats": 10.0},
+    }
+
+
+async def write_elsewhere(recipe_ids, logged=True):
+    """What bump_recipe_versions() does on another worker"""
+    version = await server.storage.versions.increment("recipes")
+    if logged:
+        await server.storage.recipes.log_change(version, recipe_ids, datetime.now(timezone.utc) + timedelta(hours=1))
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    """A worker that has loaded ten recipes, with a sync that fails the test if it scans every recipe"""
+    monkeypatch.setattr(server, "storage", create_storage("memory"))
+    monkeypatch.setattr(server, "ingredient_index", server.IngredientIndex())
+    monkeypatch.setattr(server, "recipe_matrix", server.RecipeMatrix())
+    monkeypatch.setattr(server, "similarity_index", server.SimilarityIndex(10))
+    monkeypatch.setattr(server, "recipe_index_sync", server.RecipeIndexSync(0))
+
+    async def load():
+        for i in range(10):
+            await server.storage.recipes.insert(make_recipe(i, ["rice", f"spice {i}"]))
+        await server.load_recipe_indexes()
+
+    asyncio.run(load())
+
+    def full_scan(*args, **kwargs):
+        raise AssertionError("poll rescanned every recipe")
+
+    monkeypatch.setattr(server.storage.recipes, "iterate", full_scan)
+    return server.recipe_index_sync
+
+
+def test_poll_reindexes_only_recipes_written_elsewhere(sync):
+    async def scenario():
+        await server.storage.recipes.insert(make_recipe(10, ["saffron"]))
+        await write_elsewhere(["recipe-10"])
+        await server.storage.recipes.replace(make_recipe(1, ["truffle"]))
+        await write_elsewhere(["recipe-1"])
+        await server.storage.recipes.delete("recipe-2")
+        await write_elsewhere(["recipe-2"])
+        await sync.poll()
+
+    asyncio.run(scenario())
+
+    assert server.ingredient_index.search(["saffron"], 5) == [("recipe-10", ["saffron"])]
+    assert server.ingredient_index.search(["truffle"], 5) == [("recipe-1", ["truffle"])]
+    assert "recipe-2" not in server.recipe_matrix.rows
+    assert sync.version == 3 and sync.full_refreshes == 0
+
+
+def test_own_writes_are_not_refreshed(sync):
+    async def scenario():
+        recipe = make_recipe(10, ["cumin"])
+        await server.storage.recipes.insert(recipe)
+        await server.recipes_inserted([recipe])
+        await sync.poll()
+
+    asyncio.run(scenario())
+
+    assert sync.version == 1 and sync.refreshes == 0
+
+
+def test_write_missing_from_the_log_forces_a_rescan_after_the_timeout(sync, monkeypatch):
+    async def scenario():
+        await server.storage.recipes.replace(make_recipe(3, ["lost"]))
+        await write_elsewhere(["recipe-3"], logged=False)
+        await server.storage.recipes.replace(make_recipe(4, ["found"]))
+        await write_elsewhere(["recipe-4"])
+        await sync.poll()
+        # The logged write is applied at once; the missing one holds the version back
+        assert server.ingredient_index.search(["found"], 5) == [("recipe-4", ["found"])]
+        assert server.ingredient_index.search(["lost"], 5) == []
+        assert sync.version == 0
+
+        # Past the timeout the rescan is expected
+        monkeypatch.setattr(server, "RECIPE_INDEX_SYNC_GAP_TIMEOUT", 0)
+        monkeypatch.delattr(server.storage.recipes, "iterate")
+        await asyncio.sleep(0.01)
+        await sync.poll()
+
+    asyncio.run(scenario())
+
+    assert server.ingredient_index.search(["lost"], 5) == [("recipe-3", ["lost"])]
+    assert sync.version == 2 and sync.full_refreshes == 1 and not sync.applied
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import server  # noqa: E402
+
+
+def make_recipe(i, ingredients, calories=400.0):
+    return {
+        "id": f"recipe-{i}",
+        "category": "Dinner",
+        "difficulty": "Easy",
+        "ingredients": ingredients,
+        "nutrition": {"calories": calories, "protein": 20.0, "carbs": 40.0, "fats": 10.0},
+    }
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """A fresh ingredient index, recipe matrix and similarity index holding six recipes of one category"""
+    monkeypatch.setattr(server, "ingredient_index", server.IngredientIndex())
+    monkeypatch.setattr(server, "recipe_matrix", server.RecipeMatrix())
+    similarity = server.SimilarityIndex(10)
+    recipes = [make_recipe(i, ["rice", "onion", f"spice {i}"], 300.0 + 25 * i) for i in range(6)]
+    for recipe in recipes:
+        server.ingredient_index.add(recipe["id"], server.ingredient_terms(recipe["ingredients"]))
+    for recipe in recipes:
+        server.recipe_matrix.upsert(recipe)
+    for recipe in recipes:
+        similarity.similar(recipe["id"], 10)
+    return similarity, recipes
+
+
+def replace(similarity, recipe):
+    """What recipe_replaced() does to the in-memory indexes"""
+    server.ingredient_index.add(recipe["id"], server.ingredient_terms(recipe["ingredients"]))
+    server.recipe_matrix.upsert(recipe)
+    similarity.remove(recipe["id"])
+    similarity.insert(recipe["id"])
+
+
+def test_repeated_updates_do_not_duplicate_neighbors(index):
+    similarity, recipes = index
+    updated = dict(recipes[0])
+    for calories in (250.0, 900.0, 420.0):
+        updated = {**updated, "nutrition": {**updated["nutrition"], "calories": calories}}
+        replace(similarity, updated)
+
+    for recipe in recipes:
+        neighbor_ids = [neighbor_id for neighbor_id, _ in similarity.similar(recipe["id"], 10)]
+        assert len(neighbor_ids) == len(set(neighbor_ids)) == 5
+        assert recipe["id"] not in neighbor_ids
+
+
+def test_reoffered_recipe_is_placed_by_its_new_score(index):
+    similarity, recipes = index
+    updated = {**recipes[3], "ingredients": ["rice", "onion", "spice 0"], "nutrition": dict(recipes[0]["nutrition"])}
+    replace(similarity, updated)
+
+    neighbors = similarity.similar("recipe-0", 10)
+    assert neighbors[0][0] == "recipe-3"
+    scores = [score for _, score in neighbors]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_similar_is_unavailable_until_the_first_rebuild(index, monkeypatch):
+    similarity, recipes = index
+    monkeypatch.setattr(server, "similarity_index", similarity)
+
+    async def similar():
+        return await server.get_similar_recipes(recipes[0]["id"], k=5, fields=None)
+
+    with pytest.raises(server.HTTPException) as raised:
+        asyncio.run(similar())
+    assert raised.value.status_code == 503
+
+    asyncio.run(similarity.rebuild())
+    assert similarity.ready
+    asyncio.run(similar())